@@ -0,0 +1,485 @@
+"""GLB/glTF optimization for Sketchfab downloads before they are committed to a game repo.
+
+For every model in a downloaded bundle (zip archive or bare .glb) this:
+  * downscales textures above ASSET_MAX_TEXTURE_SIZE and recompresses PNG/JPEG images,
+  * deduplicates byte-identical images,
+  * drops images no texture uses, then bufferViews and buffers nothing references,
+  * drops archive files no glTF references (license/readme files are kept).
+
+Results are cached on disk by input hash, so each model is optimized only once.
+Pillow is optional; without it textures are left as-is and only the structural passes run.
+"""
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import posixpath
+import struct
+import tempfile
+import zipfile
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import unquote
+
+ASSET_MAX_TEXTURE_SIZE = int(os.getenv("ASSET_MAX_TEXTURE_SIZE", "1024"))
+ASSET_JPEG_QUALITY = int(os.getenv("ASSET_JPEG_QUALITY", "85"))
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.join(tempfile.gettempdir(), "playful-asset-cache"))
+# Least recently used bundles are pruned once the cache grows past this.
+ASSET_CACHE_MAX_BYTES = int(os.getenv("ASSET_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Bump when the optimizer output changes so stale cache entries are ignored.
+OPTIMIZER_VERSION = 1
+
+GLB_MAGIC = 0x46546C67
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+# These extensions address buffers by byte offset from inside extension objects,
+# which the compaction pass does not rewrite.
+UNSUPPORTED_EXTENSIONS = {"EXT_meshopt_compression", "KHR_meshopt_compression"}
+KEEP_FILE_PREFIXES = ("license", "licence", "readme", "copyright")
+
+
+@dataclass
+class OptimizationReport:
+    uid: str
+    original_bytes: int = 0
+    optimized_bytes: int = 0
+    images_deduplicated: int = 0
+    images_removed: int = 0
+    textures_resized: int = 0
+    textures_recompressed: int = 0
+    buffer_views_removed: int = 0
+    buffers_removed: int = 0
+    files_removed: int = 0
+    cached: bool = False
+
+    def absorb(self, other: "OptimizationReport"):
+        for name in ("images_deduplicated", "images_removed", "textures_resized", "textures_recompressed",
+                     "buffer_views_removed", "buffers_removed"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - self.optimized_bytes
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["saved_bytes"] = self.saved_bytes
+        data["saved_percent"] = round(100.0 * self.saved_bytes / self.original_bytes, 1) if self.original_bytes else 0.0
+        return data
+
+
+# ==========================================
+# BUNDLE I/O
+# ==========================================
+def read_bundle(payload: bytes, uid: str) -> Dict[str, bytes]:
+    """Sketchfab serves either a zip archive or a bare binary glTF."""
+    if payload[:4] == b"glTF":
+        return {f"{uid}.glb": payload}
+    files = {}
+    with zipfile.ZipFile(io.BytesIO(payload)) as z:
+        for info in z.infolist():
+            if not info.is_dir():
+                files[info.filename] = z.read(info.filename)
+    return files
+
+
+def parse_glb(data: bytes) -> Tuple[dict, Optional[bytes]]:
+    magic, version, length = struct.unpack_from("<III", data, 0)
+    if magic != GLB_MAGIC or version != 2:
+        raise ValueError("Not a glTF 2.0 binary")
+    offset, document, binary = 12, None, None
+    while offset < min(length, len(data)):
+        chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON:
+            document = json.loads(chunk.decode("utf-8"))
+        elif chunk_type == CHUNK_BIN and binary is None:
+            binary = chunk
+        offset += 8 + chunk_length
+    if document is None:
+        raise ValueError("GLB has no JSON chunk")
+    return document, binary
+
+
+def _pad4(data: bytes, fill: bytes) -> bytes:
+    return data + fill * ((4 - len(data) % 4) % 4)
+
+
+def write_glb(document: dict, binary: Optional[bytes]) -> bytes:
+    json_chunk = _pad4(json.dumps(document, separators=(",", ":")).encode("utf-8"), b" ")
+    body = struct.pack("<II", len(json_chunk), CHUNK_JSON) + json_chunk
+    if binary is not None:
+        binary = _pad4(binary, b"\x00")
+        body += struct.pack("<II", len(binary), CHUNK_BIN) + binary
+    return struct.pack("<III", GLB_MAGIC, 2, 12 + len(body)) + body
+
+
+def _decode_data_uri(uri: str) -> bytes:
+    return base64.b64decode(uri.split(",", 1)[1])
+
+
+def _encode_data_uri(data: bytes, mime: str) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+# ==========================================
+# TEXTURES
+# ==========================================
+def recompress_image(data: bytes, max_size: int, jpeg_quality: int) -> Optional[Tuple[bytes, bool]]:
+    """Returns (new_bytes, resized) when the image got smaller or had to be downscaled, else None."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            fmt = img.format
+            if fmt not in ("PNG", "JPEG"):
+                return None
+            resized = max(img.size) > max_size
+            if resized:
+                img.thumbnail((max_size, max_size), Image.LANCZOS)
+            out = io.BytesIO()
+            if fmt == "JPEG":
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                img.save(out, "JPEG", quality=jpeg_quality, optimize=True, progressive=True)
+            else:
+                img.save(out, "PNG", optimize=True)
+    except Exception as e:
+        logging.warning(f"Texture recompression skipped: {e}")
+        return None
+    new_data = out.getvalue()
+    if resized or len(new_data) < len(data):
+        return new_data, resized
+    return None
+
+
+# ==========================================
+# DOCUMENT PASSES
+# ==========================================
+def _rewrite_refs(node: Any, key: str, mapping: Dict[int, int]):
+    """Rewrites every integer ``key`` found under ``node`` through ``mapping``."""
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k == key and isinstance(v, int) and v in mapping:
+                node[k] = mapping[v]
+            else:
+                _rewrite_refs(v, key, mapping)
+    elif isinstance(node, list):
+        for item in node:
+            _rewrite_refs(item, key, mapping)
+
+
+def _collect_refs(node: Any, key: str, found: Set[int]):
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k == key and isinstance(v, int):
+                found.add(v)
+            else:
+                _collect_refs(v, key, found)
+    elif isinstance(node, list):
+        for item in node:
+            _collect_refs(item, key, found)
+
+
+def optimize_document(document: dict, buffers: List[Optional[bytes]], load_uri: Callable[[str], Optional[bytes]],
+                      report: OptimizationReport, max_size: int, jpeg_quality: int) -> Tuple[List[Optional[bytes]], Dict[int, bytes]]:
+    """Runs the texture and pruning passes in place on ``document``.
+
+    ``buffers[i]`` holds the bytes of buffer ``i`` (None if unavailable). Returns the
+    rebuilt buffer list (aligned with the new ``document["buffers"]``) and the new
+    bytes of every external image whose content changed, keyed by new image index.
+    """
+    images = document.get("images", [])
+    views = document.get("bufferViews", [])
+
+    # 1. Load image bytes and recompress.
+    image_bytes: List[Optional[bytes]] = []
+    changed: Dict[int, bool] = {}
+    for i, image in enumerate(images):
+        data = None
+        if "bufferView" in image:
+            view = views[image["bufferView"]]
+            source = buffers[view["buffer"]]
+            if source is not None:
+                start = view.get("byteOffset", 0)
+                data = source[start:start + view["byteLength"]]
+        elif image.get("uri", "").startswith("data:"):
+            data = _decode_data_uri(image["uri"])
+        elif "uri" in image:
+            data = load_uri(image["uri"])
+        if data is not None:
+            result = recompress_image(data, max_size, jpeg_quality)
+            if result:
+                data, changed[i] = result
+        image_bytes.append(data)
+
+    # 2. Point textures at the first copy of identical images.
+    first_seen: Dict[str, int] = {}
+    duplicates: Dict[int, int] = {}
+    for i, data in enumerate(image_bytes):
+        if data is None:
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in first_seen:
+            duplicates[i] = first_seen[digest]
+        else:
+            first_seen[digest] = i
+    report.images_deduplicated += len(duplicates)
+    textures = document.get("textures", [])
+    _rewrite_refs(textures, "source", duplicates)
+
+    # 3. Keep only images some texture still samples.
+    used_images: Set[int] = set()
+    _collect_refs(textures, "source", used_images)
+    keep_images = [i for i in range(len(images)) if i in used_images]
+    report.images_removed += len(images) - len(keep_images)
+    image_map = {old: new for new, old in enumerate(keep_images)}
+    _rewrite_refs(textures, "source", image_map)
+    if images:
+        document["images"] = [images[i] for i in keep_images]
+
+    view_overrides: Dict[int, bytes] = {}
+    external_images: Dict[int, bytes] = {}
+    for old, new in image_map.items():
+        image = images[old]
+        if old not in changed:
+            continue
+        report.textures_resized += int(changed[old])
+        report.textures_recompressed += int(not changed[old])
+        if "bufferView" in image:
+            view_overrides[image["bufferView"]] = image_bytes[old]
+        elif image.get("uri", "").startswith("data:"):
+            image["uri"] = _encode_data_uri(image_bytes[old], image.get("mimeType", "image/png"))
+        else:
+            external_images[new] = image_bytes[old]
+
+    # 4. Drop bufferViews nothing references and repack each buffer.
+    used_views: Set[int] = set()
+    _collect_refs({k: v for k, v in document.items() if k != "bufferViews"}, "bufferView", used_views)
+    keep_views = [i for i in range(len(views)) if i in used_views]
+    report.buffer_views_removed += len(views) - len(keep_views)
+
+    packed: List[bytes] = [b"" for _ in buffers]
+    for i in keep_views:
+        view = views[i]
+        b = view["buffer"]
+        if buffers[b] is None:
+            continue
+        start = view.get("byteOffset", 0)
+        data = view_overrides.get(i, buffers[b][start:start + view["byteLength"]])
+        packed[b] = _pad4(packed[b], b"\x00")
+        view["byteOffset"] = len(packed[b])
+        view["byteLength"] = len(data)
+        packed[b] += data
+
+    view_map = {old: new for new, old in enumerate(keep_views)}
+    _rewrite_refs({k: v for k, v in document.items() if k != "bufferViews"}, "bufferView", view_map)
+    if views:
+        document["bufferViews"] = [views[i] for i in keep_views]
+
+    # 5. Drop buffers that no longer back any view.
+    old_buffers = document.get("buffers", [])
+    used_buffers: Set[int] = set()
+    _collect_refs(document.get("bufferViews", []), "buffer", used_buffers)
+    keep_buffers = [i for i in range(len(old_buffers)) if i in used_buffers]
+    report.buffers_removed += len(old_buffers) - len(keep_buffers)
+    _rewrite_refs(document.get("bufferViews", []), "buffer", {old: new for new, old in enumerate(keep_buffers)})
+
+    new_buffers: List[Optional[bytes]] = []
+    for i in keep_buffers:
+        data = packed[i] if buffers[i] is not None else None
+        if data is not None:
+            old_buffers[i]["byteLength"] = len(data)
+        new_buffers.append(data)
+    if old_buffers:
+        document["buffers"] = [old_buffers[i] for i in keep_buffers]
+    return new_buffers, external_images
+
+
+def _has_unsupported_extensions(document: dict) -> bool:
+    return bool(UNSUPPORTED_EXTENSIONS.intersection(document.get("extensionsUsed", [])))
+
+
+def optimize_glb(data: bytes, report: OptimizationReport, max_size: int, jpeg_quality: int) -> bytes:
+    document, binary = parse_glb(data)
+    if _has_unsupported_extensions(document):
+        return data
+    # The BIN chunk backs the first buffer when that buffer has no uri.
+    buffers: List[Optional[bytes]] = []
+    for i, buffer in enumerate(document.get("buffers", [])):
+        if "uri" not in buffer:
+            buffers.append(binary if i == 0 else None)
+        elif buffer["uri"].startswith("data:"):
+            buffers.append(_decode_data_uri(buffer["uri"]))
+        else:
+            buffers.append(None)
+
+    # Work on a scratch report so nothing is counted if the rewrite is discarded.
+    scratch = OptimizationReport(uid=report.uid)
+    new_buffers, _ = optimize_document(document, buffers, lambda uri: None, scratch, max_size, jpeg_quality)
+    new_binary = None
+    for buffer, packed in zip(document.get("buffers", []), new_buffers):
+        if "uri" not in buffer:
+            new_binary = packed
+        elif buffer["uri"].startswith("data:") and packed is not None:
+            buffer["uri"] = _encode_data_uri(packed, "application/octet-stream")
+    optimized = write_glb(document, new_binary)
+    if len(optimized) >= len(data):
+        return data
+    report.absorb(scratch)
+    return optimized
+
+
+def optimize_gltf(path: str, files: Dict[str, bytes], report: OptimizationReport, max_size: int, jpeg_quality: int) -> Set[str]:
+    """Optimizes ``files[path]`` and its external resources in place; returns the paths it references."""
+    document = json.loads(files[path].decode("utf-8"))
+    base = posixpath.dirname(path)
+
+    def resolve(uri: str) -> str:
+        return posixpath.normpath(posixpath.join(base, unquote(uri)))
+
+    def external_uris() -> Set[str]:
+        uris = [b.get("uri", "") for b in document.get("buffers", [])] + [i.get("uri", "") for i in document.get("images", [])]
+        return {resolve(uri) for uri in uris if uri and not uri.startswith("data:")}
+
+    if _has_unsupported_extensions(document):
+        return external_uris()
+
+    buffers: List[Optional[bytes]] = []
+    for buffer in document.get("buffers", []):
+        uri = buffer.get("uri", "")
+        buffers.append(_decode_data_uri(uri) if uri.startswith("data:") else files.get(resolve(uri)) if uri else None)
+
+    # Stage every write (and count into a scratch report) so a failure part-way leaves files untouched.
+    scratch = OptimizationReport(uid=report.uid)
+    new_buffers, external_images = optimize_document(
+        document, buffers, lambda uri: files.get(resolve(uri)), scratch, max_size, jpeg_quality
+    )
+    updates: Dict[str, bytes] = {}
+    for buffer, data in zip(document.get("buffers", []), new_buffers):
+        uri = buffer.get("uri", "")
+        if data is None or not uri:
+            continue
+        if uri.startswith("data:"):
+            buffer["uri"] = _encode_data_uri(data, "application/octet-stream")
+        else:
+            updates[resolve(uri)] = data
+    for index, data in external_images.items():
+        updates[resolve(document["images"][index]["uri"])] = data
+    updates[path] = json.dumps(document, separators=(",", ":")).encode("utf-8")
+    referenced = external_uris()
+
+    files.update(updates)
+    report.absorb(scratch)
+    return referenced
+
+
+# ==========================================
+# CACHE & ENTRY POINT
+# ==========================================
+def _cache_path(key: str) -> str:
+    return os.path.join(ASSET_CACHE_DIR, f"{key}.zip")
+
+
+def _cache_load(key: str) -> Optional[Tuple[Dict[str, bytes], dict]]:
+    try:
+        with zipfile.ZipFile(_cache_path(key)) as z:
+            report = json.loads(z.read("__report__.json"))
+            files = {name: z.read(name) for name in z.namelist() if name != "__report__.json"}
+        # mtime doubles as last-use time for _cache_prune.
+        os.utime(_cache_path(key))
+        return files, report
+    except (OSError, KeyError, zipfile.BadZipFile, ValueError):
+        return None
+
+
+def _cache_store(key: str, files: Dict[str, bytes], report: OptimizationReport):
+    try:
+        os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=ASSET_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w", zipfile.ZIP_STORED) as z:
+            for name, data in files.items():
+                z.writestr(name, data)
+            z.writestr("__report__.json", json.dumps(report.to_dict()))
+        os.replace(tmp, _cache_path(key))
+    except OSError as e:
+        logging.warning(f"Asset cache write failed: {e}")
+        return
+    _cache_prune()
+
+
+def _cache_prune(max_bytes: int = ASSET_CACHE_MAX_BYTES):
+    """Deletes the least recently used bundles until the cache fits in `max_bytes`."""
+    entries = []
+    try:
+        with os.scandir(ASSET_CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith(".zip") and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError as e:
+        logging.warning(f"Asset cache prune failed: {e}")
+        return
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            # Another worker may have pruned it already.
+            continue
+
+
+def optimize_asset_bundle(uid: str, payload: bytes, max_size: int = ASSET_MAX_TEXTURE_SIZE,
+                          jpeg_quality: int = ASSET_JPEG_QUALITY) -> Tuple[Dict[str, bytes], OptimizationReport]:
+    """Unpacks a Sketchfab download and returns the optimized files plus a byte-savings report."""
+    key = hashlib.sha256(payload + f"|v{OPTIMIZER_VERSION}|{max_size}|{jpeg_quality}".encode("utf-8")).hexdigest()
+    cached = _cache_load(key)
+    if cached:
+        files, data = cached
+        fields = {k: v for k, v in data.items() if k in OptimizationReport.__dataclass_fields__}
+        report = OptimizationReport(**fields)
+        report.uid, report.cached = uid, True
+        return files, report
+
+    try:
+        files = read_bundle(payload, uid)
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, OSError, ValueError, RuntimeError, NotImplementedError) as e:
+        # Corrupt or unsupported archive: skip this model rather than the whole generation.
+        logging.warning(f"Skipping unreadable Sketchfab bundle {uid}: {e}")
+        return {}, OptimizationReport(uid=uid, original_bytes=len(payload), optimized_bytes=len(payload))
+    report = OptimizationReport(uid=uid, original_bytes=sum(len(d) for d in files.values()))
+
+    referenced: Set[str] = set()
+    models = [name for name in files if name.lower().endswith((".glb", ".gltf"))]
+    for name in models:
+        try:
+            if name.lower().endswith(".glb"):
+                files[name] = optimize_glb(files[name], report, max_size, jpeg_quality)
+            else:
+                referenced |= optimize_gltf(name, files, report, max_size, jpeg_quality)
+        except Exception as e:
+            # Both optimizers only write back on success, so the original bytes are intact.
+            logging.warning(f"Skipping optimization of {uid}/{name}: {e!r}")
+            referenced |= set(files)
+
+    if models:
+        for name in list(files):
+            basename = posixpath.basename(name).lower()
+            if name in models or name in referenced or basename.startswith(KEEP_FILE_PREFIXES):
+                continue
+            del files[name]
+            report.files_removed += 1
+
+    report.optimized_bytes = sum(len(d) for d in files.values())
+    _cache_store(key, files, report)
+    return files, report
@@ -0,0 +1,8 @@
+"""Load-test and benchmark harness for the Playful backend.
+
+Runs ``main.app`` against in-process/localhost stand-ins for GitHub,
+Supabase, Gemini and Sketchfab so it can be measured without live services:
+
+    python -m bench.loadtest --duration 15 --concurrency 8
+    python -m bench.loadtest --fault github:latency=80,errors=0.02 --baseline bench/baselines/default.json
+"""
@@ -0,0 +1,779 @@
+"""Localhost stand-ins for GitHub, Supabase and Sketchfab, plus an in-process Gemini fake.
+
+All three HTTP services share one FastAPI app, each under its own prefix:
+
+    /github/...     GitHub REST + git-data API (repos, contents, refs, commits, trees, blobs)
+                    and workflow dispatch/runs/jobs, with matrix jobs finishing after ``--build-seconds``
+    /supabase/...   GoTrue ``/auth/v1/user`` and a PostgREST subset under ``/rest/v1/{table}``
+    /sketchfab/...  ``/v3/search``, ``/v3/models/{uid}/download`` and the archive it points at
+
+Latency and error injection is configured per service with ``--fault``:
+
+    python -m bench.fakes --port 9100 --fault github:latency=60,jitter=20,errors=0.01
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import random
+import struct
+import time
+import uuid
+import zipfile
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+SERVICES = ("github", "supabase", "sketchfab", "gemini")
+
+
+# ==========================================
+# FAULT INJECTION
+# ==========================================
+@dataclass
+class FaultSpec:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+
+    async def apply(self) -> bool:
+        """Sleeps for the configured latency; returns True when this call should fail."""
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+        return random.random() < self.error_rate
+
+
+def parse_fault(spec: str) -> Tuple[str, FaultSpec]:
+    """Parses ``service:latency=50,jitter=10,errors=0.02``."""
+    service, _, options = spec.partition(":")
+    if service not in SERVICES:
+        raise argparse.ArgumentTypeError(f"Unknown service '{service}', expected one of {', '.join(SERVICES)}")
+    fault = FaultSpec()
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key == "latency":
+            fault.latency_ms = float(value)
+        elif key == "jitter":
+            fault.jitter_ms = float(value)
+        elif key == "errors":
+            fault.error_rate = float(value)
+        else:
+            raise argparse.ArgumentTypeError(f"Unknown fault option '{key}'")
+    return service, fault
+
+
+# ==========================================
+# SAMPLE ASSETS
+# ==========================================
+def _png(size: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    rows = b"".join(b"\x00" + bytes(rng.getrandbits(8) for _ in range(size * 3)) for _ in range(size))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+def _pad(data: bytes, fill: bytes) -> bytes:
+    return data + fill * ((4 - len(data) % 4) % 4)
+
+
+def build_sample_glb(texture_size: int = 256) -> bytes:
+    """A textured triangle with one duplicated and one unreferenced image, to give the optimizer work."""
+    texture = _png(texture_size, seed=1)
+    orphan = _png(texture_size // 2, seed=2)
+    chunks = [
+        struct.pack("<9f", 0, 0, 0, 1, 0, 0, 0, 1, 0),
+        struct.pack("<6f", 0, 0, 1, 0, 0, 1),
+        texture,
+        texture,
+        orphan,
+    ]
+    binary = b""
+    views = []
+    for data in chunks:
+        views.append({"buffer": 0, "byteOffset": len(binary), "byteLength": len(data)})
+        binary = _pad(binary + data, b"\x00")
+
+    gltf = {
+        "asset": {"version": "2.0", "generator": "playful-bench"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0, "TEXCOORD_0": 1}, "material": 0}]}],
+        "materials": [{
+            "pbrMetallicRoughness": {"baseColorTexture": {"index": 0}},
+            "emissiveTexture": {"index": 1},
+        }],
+        "textures": [{"source": 0}, {"source": 1}],
+        "images": [
+            {"bufferView": 2, "mimeType": "image/png"},
+            {"bufferView": 3, "mimeType": "image/png"},
+            {"bufferView": 4, "mimeType": "image/png"},
+        ],
+        "accessors": [
+            {"bufferView": 0, "componentType": 5126, "count": 3, "type": "VEC3", "min": [0, 0, 0], "max": [1, 1, 0]},
+            {"bufferView": 1, "componentType": 5126, "count": 3, "type": "VEC2"},
+        ],
+        "bufferViews": views,
+        "buffers": [{"byteLength": len(binary)}],
+    }
+    json_chunk = _pad(json.dumps(gltf, separators=(",", ":")).encode("utf-8"), b" ")
+    total = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    return (
+        struct.pack("<III", 0x46546C67, 2, total)
+        + struct.pack("<II", len(json_chunk), 0x4E4F534A) + json_chunk
+        + struct.pack("<II", len(binary), 0x004E4942) + binary
+    )
+
+
+def build_sample_archive(uid: str, texture_size: int = 256) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("scene.glb", build_sample_glb(texture_size))
+        z.writestr("license.txt", f"CC0 sample model {uid}\n")
+    return buf.getvalue()
+
+
+def sample_game_html(title: str, size_kb: int = 16) -> str:
+    filler = "\n".join(f"    // entity {i}: spin, bob and glow" for i in range(size_kb * 24))
+    return (
+        f"<!DOCTYPE html>\n<html>\n<head>\n  <title>{title}</title>\n"
+        "  <script src=\"https://cdn.babylonjs.com/babylon.js\"></script>\n</head>\n<body>\n"
+        "  <canvas id=\"renderCanvas\"></canvas>\n  <script>\n"
+        "    const canvas = document.getElementById('renderCanvas');\n"
+        "    const engine = new BABYLON.Engine(canvas, true);\n"
+        f"{filler}\n  </script>\n</body>\n</html>\n"
+    )
+
+
+# ==========================================
+# GITHUB
+# ==========================================
+def _sha(payload: bytes) -> str:
+    return hashlib.sha1(payload).hexdigest()
+
+
+class FakeGitRepo:
+    """Flat path -> blob store with just enough git-data semantics for main.py."""
+
+    def __init__(self):
+        self.blobs: Dict[str, bytes] = {}
+        self.trees: Dict[str, Dict[str, str]] = {}
+        self.commits: Dict[str, Dict[str, Any]] = {}
+        self.head = self.commit({"README.md": self.put_blob(b"# Playful\n")}, "Initial commit", [])
+
+    def put_blob(self, data: bytes) -> str:
+        sha = _sha(b"blob " + data)
+        self.blobs[sha] = data
+        return sha
+
+    def put_tree(self, flat: Dict[str, str]) -> str:
+        sha = _sha(json.dumps(sorted(flat.items())).encode("utf-8"))
+        self.trees[sha] = dict(flat)
+        return sha
+
+    def commit(self, flat: Dict[str, str], message: str, parents: List[str]) -> str:
+        tree_sha = self.put_tree(flat)
+        sha = _sha(f"{tree_sha}{parents}{message}{time.time_ns()}".encode("utf-8"))
+        self.commits[sha] = {"tree": tree_sha, "parents": parents, "message": message}
+        self.head = sha
+        return sha
+
+    def head_files(self) -> Dict[str, str]:
+        return dict(self.trees[self.commits[self.head]["tree"]])
+
+    def write(self, files: Dict[str, bytes], message: str):
+        flat = self.head_files()
+        for path, data in files.items():
+            flat[path] = self.put_blob(data)
+        self.commit(flat, message, [self.head])
+
+    def listing(self, flat: Dict[str, str], prefix: str, git_types: bool = False) -> List[Dict[str, Any]]:
+        """Immediate children of ``prefix``; contents API uses dir/file, the git-data API tree/blob."""
+        dir_type, file_type = ("tree", "blob") if git_types else ("dir", "file")
+        base = f"{prefix}/" if prefix else ""
+        entries: Dict[str, Dict[str, Any]] = {}
+        for path, blob_sha in flat.items():
+            if not path.startswith(base):
+                continue
+            name, _, rest = path[len(base):].partition("/")
+            if rest:
+                sub = {p[len(base) + len(name) + 1:]: s for p, s in flat.items() if p.startswith(f"{base}{name}/")}
+                entries[name] = {"name": name, "path": f"{base}{name}", "type": dir_type, "sha": self.put_tree(sub)}
+            else:
+                entries[name] = {"name": name, "path": f"{base}{name}", "type": file_type, "sha": blob_sha}
+        return list(entries.values())
+
+
+BUILD_STEPS = ("Set up job", "Initialize Capacitor Project", "Fetch Staged Game Code", "Compile Native APK", "Create Direct Download Link")
+
+
+class FakeGitHub:
+    def __init__(self, build_seconds: float = 2.0):
+        self.repos: Dict[Tuple[str, str], FakeGitRepo] = {}
+        self.workflow_runs: List[Dict[str, Any]] = []
+        self.build_seconds = build_seconds
+        self.router = APIRouter(prefix="/github")
+        self._routes()
+
+    def repo(self, owner: str, name: str) -> Optional[FakeGitRepo]:
+        return self.repos.get((owner, name))
+
+    def run_jobs(self, run: Dict[str, Any]) -> List[Dict[str, Any]]:
+        names = [p["folder"] for p in json.loads(run["inputs"].get("projects", "[]"))] or ["build"]
+        return [self.job_view(run, i, job_name) for i, job_name in enumerate(names)]
+
+    def job_view(self, run: Dict[str, Any], index: int, name: str) -> Dict[str, Any]:
+        """Derives a job's state from wall-clock time since dispatch; jobs start a little staggered."""
+        elapsed = time.monotonic() - run["started"] - 0.05 * index
+        fraction = elapsed / self.build_seconds if self.build_seconds > 0 else 1.0
+        if fraction < 0.1:
+            return {"id": run["id"] * 1000 + index, "name": name, "status": "queued", "conclusion": None, "steps": []}
+        done = min(len(BUILD_STEPS), int(len(BUILD_STEPS) * fraction))
+        steps = [
+            {"name": step, "number": n + 1, "status": "completed" if n < done else "in_progress" if n == done else "queued"}
+            for n, step in enumerate(BUILD_STEPS)
+        ]
+        finished = fraction >= 1.0
+        return {
+            "id": run["id"] * 1000 + index, "name": name, "steps": steps,
+            "status": "completed" if finished else "in_progress",
+            "conclusion": "success" if finished else None,
+        }
+
+    def _routes(self):
+        r = self.router
+
+        def missing():
+            return JSONResponse({"message": "Not Found"}, status_code=404)
+
+        @r.get("/repos/{owner}/{name}")
+        async def get_repo(owner: str, name: str):
+            if not self.repo(owner, name):
+                return missing()
+            return {"name": name, "full_name": f"{owner}/{name}", "default_branch": "main"}
+
+        async def create_repo(owner: str, request: Request):
+            body = await request.json()
+            self.repos.setdefault((owner, body["name"]), FakeGitRepo())
+            return JSONResponse({"name": body["name"], "full_name": f"{owner}/{body['name']}"}, status_code=201)
+
+        @r.post("/orgs/{owner}/repos")
+        async def create_org_repo(owner: str, request: Request):
+            return await create_repo(owner, request)
+
+        @r.post("/user/repos")
+        async def create_user_repo(request: Request):
+            return await create_repo(request.app.state.default_owner, request)
+
+        @r.get("/repos/{owner}/{name}/contents")
+        async def get_root(owner: str, name: str):
+            repo = self.repo(owner, name)
+            return repo.listing(repo.head_files(), "") if repo else missing()
+
+        @r.get("/repos/{owner}/{name}/contents/{path:path}")
+        async def get_contents(owner: str, name: str, path: str):
+            repo = self.repo(owner, name)
+            if not repo:
+                return missing()
+            flat = repo.head_files()
+            if path in flat:
+                data = repo.blobs[flat[path]]
+                return {
+                    "type": "file", "name": path.rsplit("/", 1)[-1], "path": path, "sha": flat[path],
+                    "encoding": "base64", "content": base64.b64encode(data).decode("ascii"),
+                }
+            listing = repo.listing(flat, path)
+            return listing if listing else missing()
+
+        @r.put("/repos/{owner}/{name}/contents/{path:path}")
+        async def put_contents(owner: str, name: str, path: str, request: Request):
+            repo = self.repo(owner, name)
+            if not repo:
+                return missing()
+            body = await request.json()
+            repo.write({path: base64.b64decode(body["content"])}, body.get("message", f"Update {path}"))
+            return JSONResponse({"content": {"path": path, "sha": repo.head_files()[path]}, "commit": {"sha": repo.head}}, status_code=201)
+
+        @r.delete("/repos/{owner}/{name}/contents/{path:path}")
+        async def delete_contents(owner: str, name: str, path: str, request: Request):
+            repo = self.repo(owner, name)
+            flat = repo.head_files() if repo else {}
+            if path not in flat:
+                return missing()
+            flat.pop(path)
+            body = await request.json()
+            repo.commit(flat, body.get("message", f"Delete {path}"), [repo.head])
+            return {"commit": {"sha": repo.head}}
+
+        @r.get("/repos/{owner}/{name}/git/ref/heads/{branch}")
+        async def get_ref(owner: str, name: str, branch: str):
+            repo = self.repo(owner, name)
+            return {"ref": f"refs/heads/{branch}", "object": {"sha": repo.head, "type": "commit"}} if repo else missing()
+
+        @r.patch("/repos/{owner}/{name}/git/refs/heads/{branch}")
+        async def update_ref(owner: str, name: str, branch: str, request: Request):
+            repo = self.repo(owner, name)
+            body = await request.json()
+            if not repo or body["sha"] not in repo.commits:
+                return JSONResponse({"message": "Reference update failed"}, status_code=422)
+            repo.head = body["sha"]
+            return {"ref": f"refs/heads/{branch}", "object": {"sha": repo.head, "type": "commit"}}
+
+        @r.get("/repos/{owner}/{name}/git/commits/{sha}")
+        async def get_commit(owner: str, name: str, sha: str):
+            repo = self.repo(owner, name)
+            if not repo or sha not in repo.commits:
+                return missing()
+            commit = repo.commits[sha]
+            return {"sha": sha, "message": commit["message"], "tree": {"sha": commit["tree"]}}
+
+        @r.post("/repos/{owner}/{name}/git/commits")
+        async def create_commit(owner: str, name: str, request: Request):
+            repo = self.repo(owner, name)
+            body = await request.json()
+            sha = _sha(f"{body['tree']}{body['parents']}{body['message']}{time.time_ns()}".encode("utf-8"))
+            repo.commits[sha] = {"tree": body["tree"], "parents": body["parents"], "message": body["message"]}
+            return JSONResponse({"sha": sha}, status_code=201)
+
+        @r.post("/repos/{owner}/{name}/git/blobs")
+        async def create_blob(owner: str, name: str, request: Request):
+            repo = self.repo(owner, name)
+            body = await request.json()
+            data = base64.b64decode(body["content"]) if body.get("encoding") == "base64" else body["content"].encode("utf-8")
+            return JSONResponse({"sha": repo.put_blob(data)}, status_code=201)
+
+        @r.get("/repos/{owner}/{name}/git/trees/{sha}")
+        async def get_tree(owner: str, name: str, sha: str, recursive: Optional[str] = None):
+            repo = self.repo(owner, name)
+            if not repo or sha not in repo.trees:
+                return missing()
+            if recursive:
+                flat = repo.trees[sha]
+                return {"sha": sha, "truncated": False, "tree": [{"path": p, "type": "blob", "sha": s} for p, s in sorted(flat.items())]}
+            return {"sha": sha, "tree": repo.listing(repo.trees[sha], "", git_types=True)}
+
+        @r.post("/repos/{owner}/{name}/actions/workflows/{workflow}/dispatches")
+        async def dispatch_workflow(owner: str, name: str, workflow: str, request: Request):
+            if not self.repo(owner, name):
+                return missing()
+            inputs = (await request.json()).get("inputs", {})
+            run_id = len(self.workflow_runs) + 1
+            # Mirrors the run-name of build_apk_batch.yml so callers can find their run.
+            title = f"Playful batch {inputs['batch_id']}" if "batch_id" in inputs else workflow
+            self.workflow_runs.append({
+                "id": run_id, "repo": (owner, name), "workflow": workflow, "display_title": title,
+                "inputs": inputs, "started": time.monotonic(),
+            })
+            return Response(status_code=204)
+
+        @r.get("/repos/{owner}/{name}/actions/workflows/{workflow}/runs")
+        async def list_runs(owner: str, name: str, workflow: str):
+            runs = [run for run in reversed(self.workflow_runs) if run["repo"] == (owner, name) and run["workflow"] == workflow]
+            return {
+                "total_count": len(runs),
+                "workflow_runs": [{"id": run["id"], "name": run["workflow"], "display_title": run["display_title"]} for run in runs],
+            }
+
+        @r.get("/repos/{owner}/{name}/actions/runs/{run_id}")
+        async def get_run(owner: str, name: str, run_id: int):
+            run = next((run for run in self.workflow_runs if run["id"] == run_id and run["repo"] == (owner, name)), None)
+            if not run:
+                return missing()
+            jobs = self.run_jobs(run)
+            done = all(job["status"] == "completed" for job in jobs)
+            return {
+                "id": run["id"], "name": run["workflow"], "display_title": run["display_title"],
+                "status": "completed" if done else "in_progress",
+                "conclusion": ("success" if all(job["conclusion"] == "success" for job in jobs) else "failure") if done else None,
+            }
+
+        @r.get("/repos/{owner}/{name}/actions/runs/{run_id}/jobs")
+        async def list_jobs(owner: str, name: str, run_id: int):
+            run = next((run for run in self.workflow_runs if run["id"] == run_id and run["repo"] == (owner, name)), None)
+            if not run:
+                return missing()
+            jobs = self.run_jobs(run)
+            return {"total_count": len(jobs), "jobs": jobs}
+
+        @r.post("/repos/{owner}/{name}/git/trees")
+        async def create_tree(owner: str, name: str, request: Request):
+            repo = self.repo(owner, name)
+            body = await request.json()
+            flat = dict(repo.trees.get(body.get("base_tree"), {}))
+            for item in body["tree"]:
+                path = item["path"]
+                if item["type"] == "tree":
+                    for existing in [p for p in flat if p.startswith(f"{path}/")]:
+                        flat.pop(existing)
+                    if item.get("sha"):
+                        for rel, blob_sha in repo.trees[item["sha"]].items():
+                            flat[f"{path}/{rel}"] = blob_sha
+                elif item.get("sha"):
+                    flat[path] = item["sha"]
+                else:
+                    flat.pop(path, None)
+            return JSONResponse({"sha": repo.put_tree(flat)}, status_code=201)
+
+
+# ==========================================
+# SUPABASE
+# ==========================================
+def _coerce(raw: str, sample: Any) -> Any:
+    if isinstance(sample, bool):
+        return raw.lower() == "true"
+    if isinstance(sample, int):
+        return int(raw)
+    if isinstance(sample, float):
+        return float(raw)
+    return raw
+
+
+def _matches(row: Dict[str, Any], column: str, expr: str) -> bool:
+    if expr.startswith("not."):
+        return not _matches(row, column, expr[len("not."):])
+    op, _, raw = expr.partition(".")
+    value = row.get(column)
+    if op == "is":
+        return value is None if raw == "null" else str(value).lower() == raw
+    if op == "in":
+        options = [v.strip().strip('"') for v in raw.strip("()").split(",")]
+        return str(value) in options
+    if value is None:
+        return False
+    target = _coerce(raw.strip('"'), value)
+    if op == "eq":
+        return value == target
+    if op == "neq":
+        return value != target
+    if op == "gt":
+        return value > target
+    if op == "gte":
+        return value >= target
+    if op == "lt":
+        return value < target
+    if op == "lte":
+        return value <= target
+    raise ValueError(f"Unsupported filter operator '{op}'")
+
+
+def _project(row: Dict[str, Any], select: str) -> Dict[str, Any]:
+    if select.strip() == "*":
+        return dict(row)
+    out = {}
+    for column in (c.strip() for c in select.split(",")):
+        alias, _, expr = column.rpartition(":")
+        if "->>" in expr:
+            base, _, key = expr.partition("->>")
+            value = (row.get(base) or {}).get(key)
+            out[alias or key] = None if value is None else str(value)
+        else:
+            out[alias or expr] = row.get(expr)
+    return out
+
+
+class FakeSupabase:
+    RESERVED = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+    # Mirrors the ON DELETE CASCADE foreign keys in migrations/.
+    CASCADES = {"chat_threads": ("chat_messages", "thread_id")}
+    UNIQUE = {"chat_threads": ("user_id", "game_name")}
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.sequences: Dict[str, int] = {}
+        self.tokens: Dict[str, Dict[str, Any]] = {}
+        self.router = APIRouter(prefix="/supabase")
+        self._routes()
+
+    def insert(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        rows = self.tables.setdefault(table, [])
+        row = dict(row)
+        if "id" not in row:
+            self.sequences[table] = self.sequences.get(table, 0) + 1
+            row["id"] = self.sequences[table]
+        row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        rows.append(row)
+        return row
+
+    def rpc_import_chat_history(self, params: Dict[str, Any]) -> bool:
+        """Mirrors migrations/002_chat_history_import.sql; atomic because nothing here awaits."""
+        user_id, game_name = params["p_user_id"], params["p_game_name"]
+        thread = next((t for t in self.tables.get("chat_threads", []) if t["user_id"] == user_id and t["game_name"] == game_name), None)
+        if thread is None:
+            thread = self.insert("chat_threads", {"user_id": user_id, "game_name": game_name, "history_imported": False})
+        elif thread.get("history_imported"):
+            return False
+        for m in params["p_messages"]:
+            self.insert("chat_messages", {"thread_id": thread["id"], "user_id": user_id, "role": m["role"], "content": m["content"]})
+        thread["history_imported"] = True
+        return True
+
+    def violates_unique(self, table: str, row: Dict[str, Any], ignore: Optional[Dict[str, Any]] = None) -> bool:
+        columns = self.UNIQUE.get(table)
+        if not columns:
+            return False
+        key = tuple(row.get(c) for c in columns)
+        return any(other is not ignore and tuple(other.get(c) for c in columns) == key for other in self.tables.get(table, []))
+
+    def _filtered(self, table: str, request: Request) -> List[Dict[str, Any]]:
+        rows = self.tables.get(table, [])
+        filters = [(k, v) for k, v in request.query_params.multi_items() if k not in self.RESERVED]
+        return [row for row in rows if all(_matches(row, k, v) for k, v in filters)]
+
+    def _routes(self):
+        r = self.router
+
+        def pg_error(message: str, status: int = 400):
+            return JSONResponse({"message": message, "code": "PGRST000", "details": None, "hint": None}, status_code=status)
+
+        @r.get("/auth/v1/user")
+        async def get_user(request: Request):
+            token = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+            user = self.tokens.get(token)
+            if not user:
+                return JSONResponse({"code": 401, "msg": "invalid JWT: unable to parse or verify signature"}, status_code=401)
+            return {
+                "id": user["id"], "aud": "authenticated", "role": "authenticated", "email": user["email"],
+                "app_metadata": {"provider": "email"}, "user_metadata": {}, "identities": [],
+                "created_at": "2024-01-01T00:00:00Z", "updated_at": "2024-01-01T00:00:00Z",
+            }
+
+        @r.post("/rest/v1/rpc/{function}")
+        async def call_function(function: str, request: Request):
+            handler = getattr(self, f"rpc_{function}", None)
+            if handler is None:
+                return pg_error(f"Could not find the function public.{function}", 404)
+            return handler(await request.json())
+
+        @r.get("/rest/v1/{table}")
+        async def select_rows(table: str, request: Request):
+            try:
+                rows = self._filtered(table, request)
+            except ValueError as e:
+                return pg_error(str(e))
+            order = request.query_params.get("order")
+            if order:
+                for clause in reversed(order.split(",")):
+                    column, _, direction = clause.partition(".")
+                    rows = sorted(rows, key=lambda row: (row.get(column) is None, row.get(column)), reverse=direction.startswith("desc"))
+            offset = int(request.query_params.get("offset", 0))
+            limit = request.query_params.get("limit")
+            rows = rows[offset:offset + int(limit)] if limit else rows[offset:]
+            select = request.query_params.get("select", "*")
+            return [_project(row, select) for row in rows]
+
+        @r.post("/rest/v1/{table}")
+        async def insert_rows(table: str, request: Request):
+            body = await request.json()
+            payload = body if isinstance(body, list) else [body]
+            merge = "merge-duplicates" in request.headers.get("prefer", "")
+            conflict = request.query_params.get("on_conflict", "id")
+            written = []
+            for row in payload:
+                existing = next((r for r in self.tables.get(table, []) if conflict in row and r.get(conflict) == row[conflict]), None)
+                if existing is not None and merge:
+                    existing.update(row)
+                    written.append(existing)
+                elif existing is not None or self.violates_unique(table, row):
+                    return pg_error("duplicate key value violates unique constraint", 409)
+                else:
+                    written.append(self.insert(table, row))
+            return JSONResponse(written, status_code=201)
+
+        @r.patch("/rest/v1/{table}")
+        async def update_rows(table: str, request: Request):
+            body = await request.json()
+            rows = self._filtered(table, request)
+            if any(self.violates_unique(table, {**row, **body}, ignore=row) for row in rows):
+                return pg_error("duplicate key value violates unique constraint", 409)
+            for row in rows:
+                row.update(body)
+            return rows
+
+        @r.delete("/rest/v1/{table}")
+        async def delete_rows(table: str, request: Request):
+            doomed = self._filtered(table, request)
+            ids = {id(row) for row in doomed}
+            self.tables[table] = [row for row in self.tables.get(table, []) if id(row) not in ids]
+            if table in self.CASCADES:
+                child, column = self.CASCADES[table]
+                parent_ids = {row["id"] for row in doomed}
+                self.tables[child] = [row for row in self.tables.get(child, []) if row.get(column) not in parent_ids]
+            return doomed
+
+
+# ==========================================
+# SKETCHFAB
+# ==========================================
+class FakeSketchfab:
+    def __init__(self, texture_size: int = 256):
+        self.texture_size = texture_size
+        self._archives: Dict[str, bytes] = {}
+        self.router = APIRouter(prefix="/sketchfab")
+        self._routes()
+
+    def _routes(self):
+        r = self.router
+
+        @r.get("/v3/search")
+        async def search(q: str = ""):
+            results = [
+                {
+                    "name": f"{q.title()} {i}",
+                    "uid": f"{q or 'model'}{i}",
+                    "thumbnails": {"images": [{"url": f"https://media.example/{q}{i}.jpg"}]},
+                }
+                for i in range(8)
+            ]
+            return {"results": results, "next": None}
+
+        @r.get("/v3/models/{uid}/download")
+        async def download(uid: str, request: Request):
+            base = str(request.base_url).rstrip("/")
+            return {"glb": {"url": f"{base}/sketchfab/files/{uid}.zip", "size": 0, "expires": 300}}
+
+        @r.get("/files/{uid}.zip")
+        async def archive(uid: str):
+            if uid not in self._archives:
+                self._archives[uid] = build_sample_archive(uid, self.texture_size)
+            return Response(self._archives[uid], media_type="application/zip")
+
+
+# ==========================================
+# GEMINI (in-process)
+# ==========================================
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Drop-in for ``google.generativeai.GenerativeModel`` with configurable latency and failures."""
+
+    fault = FaultSpec()
+
+    def __init__(self, model_name: str = "gemini-1.5-pro", generation_config: Optional[dict] = None, system_instruction: Optional[str] = None, **kwargs):
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+        self.system_instruction = system_instruction
+
+    async def generate_content_async(self, prompt: str, **kwargs) -> FakeResponse:
+        if await self.fault.apply():
+            raise RuntimeError("429 Resource has been exhausted (injected)")
+        if self.generation_config.get("response_mime_type") != "application/json":
+            return FakeResponse(sample_game_html(prompt[:40]))
+        if prompt.startswith("Extract"):
+            return FakeResponse(json.dumps(["tree", "car"]))
+        return FakeResponse(json.dumps({
+            "project_name": "bench_game",
+            "files": [{"path": "index.html", "type": "html", "content": sample_game_html("bench")}],
+            "assistant_message": "Done!",
+            "estimated_credits": 2.0,
+        }))
+
+
+# ==========================================
+# APP & SEED DATA
+# ==========================================
+def bench_token(index: int) -> str:
+    return f"bench-token-{index}"
+
+
+def bench_username(index: int) -> str:
+    return f"benchuser{index}"
+
+
+def seed(github: FakeGitHub, db: FakeSupabase, owner: str, builder_repo: str, users: int, games: int, chat_messages: int):
+    plans = ("free", "creator", "studio")
+    github.repos[(owner, builder_repo)] = FakeGitRepo()
+    for i in range(users):
+        user_id = str(uuid.UUID(int=i + 1))
+        username = bench_username(i)
+        db.tokens[bench_token(i)] = {"id": user_id, "email": f"{username}@bench.local"}
+        chat_history = {
+            f"game_{g}": [
+                {"role": "user" if m % 2 == 0 else "assistant", "content": f"turn {m} for game_{g}"}
+                for m in range(chat_messages)
+            ]
+            for g in range(games)
+        }
+        db.insert("users", {
+            "id": user_id, "username": username, "plan": plans[i % len(plans)], "plan_days": 30,
+            "credits": 1_000_000.0, "builds": 1_000_000, "last_reset_date": datetime.now().date().isoformat(),
+            "favorites": [], "settings": {"theme": "neon"}, "chat_history": chat_history,
+            "game_assets": {}, "monetization": {},
+        })
+        for g in range(games):
+            db.insert("projects", {
+                "id": f"project-{i}" if g == 0 else f"project-{i}-{g}", "user_id": user_id, "game_name": f"game_{g}",
+                "status": "DRAFT", "game_assets": {"sandbox_code": sample_game_html(f"{username} game_{g}")},
+            })
+        repo = FakeGitRepo()
+        repo.write({f"game_{g}/index.html": sample_game_html(f"game_{g}").encode("utf-8") for g in range(games)}, "Seed games")
+        github.repos[(owner, username)] = repo
+
+
+def create_app(faults: Dict[str, FaultSpec], owner: str = "Surya-git-enf", builder_repo: str = "Playful",
+               users: int = 32, games: int = 4, chat_messages: int = 40, texture_size: int = 256,
+               build_seconds: float = 2.0) -> FastAPI:
+    app = FastAPI(title="Playful bench fakes")
+    app.state.default_owner = owner
+    github, db, sketchfab = FakeGitHub(build_seconds), FakeSupabase(), FakeSketchfab(texture_size)
+    seed(github, db, owner, builder_repo, users, games, chat_messages)
+    stats: Dict[str, int] = {}
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        service = request.url.path.strip("/").split("/", 1)[0]
+        fault = faults.get(service)
+        stats[service] = stats.get(service, 0) + 1
+        if fault and await fault.apply():
+            return JSONResponse({"message": f"Injected {service} failure"}, status_code=503)
+        return await call_next(request)
+
+    @app.get("/_admin/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/_admin/stats")
+    async def get_stats():
+        return {"requests": stats, "repos": len(github.repos), "workflow_runs": len(github.workflow_runs)}
+
+    for router in (github.router, db.router, sketchfab.router):
+        app.include_router(router)
+    app.state.github, app.state.db, app.state.sketchfab = github, db, sketchfab
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--fault", type=parse_fault, action="append", default=[], help="service:latency=MS,jitter=MS,errors=RATE")
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--games", type=int, default=4)
+    parser.add_argument("--chat-messages", type=int, default=40)
+    parser.add_argument("--texture-size", type=int, default=256)
+    parser.add_argument("--owner", default="Surya-git-enf")
+    parser.add_argument("--builder-repo", default="Playful")
+    parser.add_argument("--build-seconds", type=float, default=2.0, help="How long each fake matrix build job takes")
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(dict(args.fault), args.owner, args.builder_repo, args.users, args.games, args.chat_messages, args.texture_size,
+                     args.build_seconds)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Import-time profile of ``main`` (cold-start cost before the first request).
+
+    python -m bench.import_profile            # top 25 modules by cumulative import time
+    python -m bench.import_profile --max-ms 400   # exit 1 if importing main takes longer
+
+Wraps ``python -X importtime -c "import main"`` in a fresh interpreter.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+
+def profile_imports(module: str = "main") -> Tuple[float, List[Tuple[int, int, int, str]]]:
+    """Returns interpreter wall time and (depth, self_us, cumulative_us, name) per imported module."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, raw_name = line[len("import time:"):].split("|")
+        name = raw_name.strip()
+        depth = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        entries.append((depth, int(self_us), int(cumulative_us), name))
+    return wall_ms, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--max-ms", type=float, help="Fail when the module's cumulative import time exceeds this")
+    args = parser.parse_args()
+
+    wall_ms, entries = profile_imports(args.module)
+    # Depth 0 is the module itself, depth 1 what it imports directly.
+    direct = [e for e in entries if e[0] <= 1]
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for _, self_us, cumulative_us, name in sorted(direct, key=lambda e: e[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+
+    module_ms = next((c / 1000 for _, _, c, name in entries if name == args.module), 0.0)
+    print(f"\nimport {args.module}: {module_ms:.1f} ms (interpreter wall time {wall_ms:.1f} ms)")
+    if args.max_ms is not None and module_ms > args.max_ms:
+        print(f"FAIL: exceeds budget of {args.max_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
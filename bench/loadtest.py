@@ -0,0 +1,392 @@
+"""Load driver: boots the fakes and the app, exercises every endpoint and reports latency, throughput and RSS.
+
+    python -m bench.loadtest --duration 15 --concurrency 8
+    python -m bench.loadtest --scenarios getchat,build_apk_ws --fault supabase:latency=30
+    python -m bench.loadtest --save-baseline bench/baselines/default.json
+    python -m bench.loadtest --baseline bench/baselines/default.json --tolerance 0.2
+
+Each scenario runs ``--concurrency`` workers for ``--duration`` seconds. Worker ``w``
+authenticates as seeded user ``w`` so stateful scenarios never collide. A run compared
+against a baseline exits non-zero when p95/p99, throughput, error rate or peak RSS regress
+beyond the tolerance.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import httpx
+
+from bench.fakes import bench_token, bench_username, parse_fault
+
+PLANS = ("free", "creator", "studio")
+TERMINAL_JOB_STATUSES = {"Build Complete!", "failed"}
+
+
+# ==========================================
+# SCENARIOS
+# ==========================================
+@dataclass
+class Worker:
+    index: int
+    client: httpx.AsyncClient
+    ws_url: str
+    state: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def project_id(self) -> str:
+        return f"project-{self.index}"
+
+    @property
+    def username(self) -> str:
+        return bench_username(self.index)
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable[[Worker], Awaitable[int]]
+    expected: Set[int] = field(default_factory=lambda: {200})
+    setup: Optional[Callable[[Worker], Awaitable[None]]] = None
+    paid_only: bool = False
+
+
+async def _post(worker: Worker, path: str, body: Optional[dict] = None) -> int:
+    return (await worker.client.post(path, json=body or {})).status_code
+
+
+async def _get(worker: Worker, path: str) -> int:
+    return (await worker.client.get(path)).status_code
+
+
+async def run_build_over_websocket(worker: Worker, path: str = "/api/build/apk", body: Optional[dict] = None) -> int:
+    """Queues an APK build and follows /ws/{job_id} until the job finishes."""
+    import websockets
+
+    resp = await worker.client.post(path, json=body or {"project_id": worker.project_id})
+    if resp.status_code != 200:
+        return resp.status_code
+    job_id = resp.json()["job_id"]
+    async with websockets.connect(f"{worker.ws_url}/ws/{job_id}") as ws:
+        while True:
+            message = json.loads(await asyncio.wait_for(ws.recv(), timeout=60))
+            if message.get("status") in TERMINAL_JOB_STATUSES:
+                return 200 if message["status"] != "failed" else 500
+
+
+async def run_batch_build_over_websocket(worker: Worker) -> int:
+    """Builds the worker's first three seeded projects as one matrix batch."""
+    project_ids = [worker.project_id, f"{worker.project_id}-1", f"{worker.project_id}-2"]
+    return await run_build_over_websocket(worker, "/api/build/apk/batch", {"project_ids": project_ids})
+
+
+async def rename_game(worker: Worker) -> int:
+    current = worker.state.get("game_name", "game_1")
+    renamed = "game_1_renamed" if current == "game_1" else "game_1"
+    status = await _post(worker, "/edit-game-name", {"old_game_name": current, "new_game_name": renamed})
+    if status == 200:
+        worker.state["game_name"] = renamed
+    return status
+
+
+async def delete_game(worker: Worker) -> int:
+    worker.state["deleted"] = worker.state.get("deleted", 0) + 1
+    game = "game_3" if worker.state["deleted"] == 1 else f"scratch_{worker.state['deleted']}"
+    return await _post(worker, "/deletegame", {"game_name": game})
+
+
+async def toggle_favorite(worker: Worker) -> int:
+    worker.state["favorite"] = not worker.state.get("favorite", False)
+    return await _post(worker, "/toggle-favorite", {"game_name": "game_0", "is_favorite": worker.state["favorite"]})
+
+
+async def page_chat(worker: Worker) -> int:
+    """Walks a game's chat history newest-to-oldest, 20 messages per request."""
+    body = {"game_name": "game_0", "limit": 20}
+    if worker.state.get("cursor"):
+        body["cursor"] = worker.state["cursor"]
+    resp = await worker.client.post("/getchat", json=body)
+    if resp.status_code == 200:
+        worker.state["cursor"] = resp.json().get("next_cursor")
+    return resp.status_code
+
+
+async def fetch_preview(worker: Worker) -> int:
+    """Reloads the sandbox preview the way a browser would, revalidating with the last ETag."""
+    headers = {"Accept-Encoding": "br, gzip"}
+    if worker.state.get("etag"):
+        headers["If-None-Match"] = worker.state["etag"]
+    resp = await worker.client.get(f"/api/sandbox/preview/{worker.project_id}", headers=headers)
+    if resp.status_code == 200:
+        worker.state["etag"] = resp.headers.get("etag")
+    return resp.status_code
+
+
+async def queue_job(worker: Worker):
+    resp = await worker.client.post("/api/build/apk", json={"project_id": worker.project_id})
+    worker.state["job_id"] = resp.json().get("job_id", str(uuid.uuid4()))
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario("health", lambda w: _get(w, "/health")),
+    Scenario("livez", lambda w: _get(w, "/livez")),
+    Scenario("readyz", lambda w: _get(w, "/readyz")),
+    Scenario("metrics", lambda w: _get(w, "/metrics")),
+    Scenario("search_assets", lambda w: _post(w, "/search-assets", {"prompt": "a racing car in a pine forest"})),
+    Scenario("sandbox_generate", lambda w: _post(w, "/api/sandbox/generate", {"project_id": w.project_id, "prompt": "A neon space shooter"})),
+    Scenario("sandbox_generate_assets", lambda w: _post(w, "/api/sandbox/generate", {
+        "project_id": w.project_id, "prompt": "A car racing game", "selected_uids": [f"car{w.index}"],
+    })),
+    Scenario("sandbox_update", lambda w: _post(w, "/api/sandbox/update", {"project_id": w.project_id, "new_prompt": "Make the ship faster"})),
+    Scenario("sandbox_preview", fetch_preview, expected={200, 304}),
+    Scenario("sandbox_preview_full", lambda w: _get(w, f"/api/sandbox/preview/{w.project_id}")),
+    Scenario("build_apk_ws", run_build_over_websocket),
+    Scenario("build_apk_batch_ws", run_batch_build_over_websocket),
+    Scenario("status", lambda w: _get(w, f"/status/{w.state['job_id']}"), setup=queue_job),
+    Scenario("addadmob", lambda w: _post(w, "/addadmob", {
+        "admob_banner": "ca-app-pub-1/banner", "admob_interstitial": "ca-app-pub-1/inter", "admob_interval": "5",
+    }), paid_only=True),
+    Scenario("edit_game_name", rename_game),
+    Scenario("deletegame", delete_game),
+    Scenario("getgames", lambda w: _post(w, "/getgames")),
+    Scenario("getchat", page_chat),
+    Scenario("toggle_favorite", toggle_favorite),
+    Scenario("update_settings", lambda w: _post(w, "/update-settings", {"theme": "midnight"})),
+]
+
+
+# ==========================================
+# MEASUREMENT
+# ==========================================
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        return None
+    return None
+
+
+class RssSampler:
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid, self.interval = pid, interval
+        self.peak_mb: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _loop(self):
+        while True:
+            rss = read_rss_mb(self.pid)
+            if rss is not None:
+                self.peak_mb = max(self.peak_mb or 0.0, rss)
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak_mb = read_rss_mb(self.pid)
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+async def run_scenario(scenario: Scenario, base_url: str, users: int, concurrency: int, duration: float, app_pid: int) -> Dict[str, Any]:
+    eligible = [i for i in range(users) if not scenario.paid_only or PLANS[i % len(PLANS)] != "free"]
+    latencies: List[float] = []
+    errors = 0
+    statuses: Dict[str, int] = {}
+    ws_url = base_url.replace("http", "ws", 1)
+
+    async def work(slot: int):
+        nonlocal errors
+        index = eligible[slot % len(eligible)]
+        headers = {"Authorization": f"Bearer {bench_token(index)}"}
+        async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=120.0) as client:
+            worker = Worker(index, client, ws_url)
+            if scenario.setup:
+                await scenario.setup(worker)
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status = await scenario.run(worker)
+                except Exception as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - start)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status not in scenario.expected:
+                    errors += 1
+
+    with RssSampler(app_pid) as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(work(slot) for slot in range(min(concurrency, len(eligible)))))
+        elapsed = time.perf_counter() - started
+
+    total = len(latencies)
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rss_peak_mb": rss.peak_mb,
+        "statuses": statuses,
+    }
+
+
+# ==========================================
+# BASELINES
+# ==========================================
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for name, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for metric in ("p95_ms", "p99_ms", "rss_peak_mb"):
+            if base.get(metric) and current.get(metric) and current[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {current[metric]:.1f} > baseline {base[metric]:.1f}")
+        if base["throughput_rps"] and current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput_rps']:.1f} < baseline {base['throughput_rps']:.1f} rps")
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {current['error_rate']:.2%} > baseline {base['error_rate']:.2%}")
+    return regressions
+
+
+def print_report(results: Dict[str, Any]):
+    header = f"{'scenario':<26}{'reqs':>7}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results["scenarios"].items():
+        rss = f"{r['rss_peak_mb']:.1f}" if r["rss_peak_mb"] is not None else "n/a"
+        print(f"{name:<26}{r['requests']:>7}{r['errors']:>6}{r['throughput_rps']:>9.1f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{rss:>9}")
+
+
+# ==========================================
+# ORCHESTRATION
+# ==========================================
+def spawn(args: List[str], log) -> subprocess.Popen:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen([sys.executable, "-m", *args], cwd=root, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.perf_counter() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+async def run(args) -> int:
+    faults = dict(args.fault)
+    fakes_url = f"http://127.0.0.1:{args.fakes_port}"
+    app_url = f"http://127.0.0.1:{args.app_port}"
+    fake_args = ["bench.fakes", "--port", str(args.fakes_port), "--users", str(args.users)]
+    for service, spec in faults.items():
+        if service != "gemini":
+            fake_args += ["--fault", f"{service}:latency={spec.latency_ms},jitter={spec.jitter_ms},errors={spec.error_rate}"]
+    gemini = faults.get("gemini")
+    app_args = ["bench.serve_app", "--port", str(args.app_port), "--fakes-url", fakes_url]
+    if gemini:
+        app_args += ["--gemini-fault", f"latency={gemini.latency_ms},jitter={gemini.jitter_ms},errors={gemini.error_rate}"]
+
+    selected = [s for s in SCENARIOS if args.scenarios == "all" or s.name in args.scenarios.split(",")]
+    log = open(args.log, "a")
+    fakes, app = spawn(fake_args, log), None
+    try:
+        await wait_until_up(f"{fakes_url}/_admin/health")
+        app = spawn(app_args, log)
+        await wait_until_up(f"{app_url}/readyz")
+        results = {
+            "config": {
+                "duration": args.duration, "concurrency": args.concurrency, "users": args.users,
+                "faults": {k: vars(v) for k, v in faults.items()}, "python": platform.python_version(),
+            },
+            "scenarios": {},
+        }
+        for scenario in selected:
+            print(f"running {scenario.name} ...", file=sys.stderr)
+            results["scenarios"][scenario.name] = await run_scenario(
+                scenario, app_url, args.users, args.concurrency, args.duration, app.pid
+            )
+    finally:
+        for proc in (app, fakes):
+            if proc:
+                proc.terminate()
+                proc.wait(timeout=10)
+        log.close()
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="all", help="Comma separated scenario names, or 'all'")
+    parser.add_argument("--list", action="store_true", help="List scenarios and exit")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=32, help="Seeded users; must be >= concurrency")
+    parser.add_argument("--fault", type=parse_fault, action="append", default=[], help="service:latency=MS,jitter=MS,errors=RATE")
+    parser.add_argument("--fakes-port", type=int, default=9100)
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--log", default=os.devnull, help="Where to send fake/app server output")
+    parser.add_argument("--output", help="Write the full results JSON here")
+    parser.add_argument("--baseline", help="Compare against a saved baseline and exit 1 on regression")
+    parser.add_argument("--save-baseline", help="Save this run as a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative slowdown before flagging")
+    args = parser.parse_args()
+
+    if args.list:
+        for scenario in SCENARIOS:
+            print(scenario.name)
+        return
+    if args.users < args.concurrency:
+        parser.error("--users must be >= --concurrency so workers do not share state")
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
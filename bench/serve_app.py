@@ -0,0 +1,48 @@
+"""Serves ``main.app`` wired to the bench fakes instead of live services.
+
+    python -m bench.serve_app --port 8100 --fakes-url http://127.0.0.1:9100 --gemini-fault latency=400,errors=0.01
+"""
+import argparse
+import os
+
+from bench.fakes import FakeGenerativeModel, parse_fault
+
+
+def configure_environment(fakes_url: str):
+    fakes_url = fakes_url.rstrip("/")
+    os.environ["SUPABASE_URL"] = f"{fakes_url}/supabase"
+    # supabase-py insists on a JWT-shaped key; the fake never checks it.
+    os.environ["SUPABASE_KEY"] = "bench.fake.key"
+    os.environ["GITHUB_API_URL"] = f"{fakes_url}/github"
+    os.environ["SKETCHFAB_API_URL"] = f"{fakes_url}/sketchfab/v3"
+    os.environ["PLAYFUL_GH_TOKEN"] = "bench-gh-token"
+    os.environ["SKETCHFAB_API_TOKEN"] = "bench-sketchfab-token"
+    os.environ["BUILD_PACING_SCALE"] = "0"
+    os.environ["BATCH_POLL_INTERVAL_SECS"] = "0.25"
+
+
+def load_app():
+    """Imports main with Gemini replaced by the in-process fake and rate limiting disabled."""
+    import main as playful_main
+    playful_main.get_generative_model = FakeGenerativeModel
+    playful_main.limiter.enabled = False
+    return playful_main.app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--fakes-url", default="http://127.0.0.1:9100")
+    parser.add_argument("--gemini-fault", default="", help="latency=MS,jitter=MS,errors=RATE")
+    args = parser.parse_args()
+
+    configure_environment(args.fakes_url)
+    _, FakeGenerativeModel.fault = parse_fault(f"gemini:{args.gemini_fault}")
+
+    import uvicorn
+    uvicorn.run(load_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,32 @@
 import os
 import re
+import gzip
 import json
 import uuid
 import httpx
 import base64
-import zipfile
-import io
+import hashlib
 import asyncio
 import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from datetime import date, datetime
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 
 from fastapi import FastAPI, BackgroundTasks, WebSocket, WebSocketDisconnect, HTTPException, Depends, Request, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel, Field
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from supabase import create_client, Client
-import google.generativeai as genai
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 # ==========================================
 # 1. LOGGING & SECURITY CONFIGURATION
@@ -33,28 +40,118 @@ GITHUB_OWNER = os.getenv("GITHUB_OWNER", "Surya-git-enf")
 PLAYFUL_BUILDER_REPO = os.getenv("PLAYFUL_BUILDER_REPO", "Playful")
 SKETCHFAB_API_TOKEN = os.getenv("SKETCHFAB_API_TOKEN", "your-sketchfab-token-here")
 PLAYFUL_DEFAULT_ADMOB_ID = os.getenv("PLAYFUL_DEFAULT_ADMOB_ID", "ca-app-pub-xxx/default")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+SKETCHFAB_API_URL = os.getenv("SKETCHFAB_API_URL", "https://api.sketchfab.com/v3")
+# Scales the cosmetic pauses between APK build stages (0 disables them, e.g. for benchmarks)
+BUILD_PACING_SCALE = float(os.getenv("BUILD_PACING_SCALE", "1.0"))
+
+# Batch (matrix) APK builds
+BATCH_BUILD_WORKFLOW = os.getenv("BATCH_BUILD_WORKFLOW", "build_apk_batch.yml")
+MAX_BATCH_BUILD_PROJECTS = int(os.getenv("MAX_BATCH_BUILD_PROJECTS", "20"))
+BATCH_POLL_INTERVAL_SECS = float(os.getenv("BATCH_POLL_INTERVAL_SECS", "15"))
+BATCH_BUILD_TIMEOUT_SECS = float(os.getenv("BATCH_BUILD_TIMEOUT_SECS", "3600"))
 
 # Monetization Defaults
 PLAYFUL_DEFAULT_BANNER_ID = os.getenv("PLAYFUL_DEFAULT_BANNER_ID", "ca-app-pub-xxx/banner")
 PLAYFUL_DEFAULT_INTERSTITIAL_ID = os.getenv("PLAYFUL_DEFAULT_INTERSTITIAL_ID", "ca-app-pub-xxx/interstitial")
 PLAYFUL_AD_INTERVAL_MINS = os.getenv("PLAYFUL_AD_INTERVAL_MINS", "10")
 
+# Chat History
+CHAT_CONTEXT_TURNS = int(os.getenv("CHAT_CONTEXT_TURNS", "8"))
+CHAT_PAGE_SIZE_MAX = 200
+# verify_user retries a failed blob migration with exponential backoff, then leaves
+# it to migrations/migrate_chat_history.py so requests stop paying for it.
+CHAT_MIGRATION_RETRY_SECS = float(os.getenv("CHAT_MIGRATION_RETRY_SECS", "60"))
+CHAT_MIGRATION_MAX_INLINE_ATTEMPTS = int(os.getenv("CHAT_MIGRATION_MAX_INLINE_ATTEMPTS", "3"))
+
+# Sandbox Preview
+PREVIEW_CACHE_ENTRIES = int(os.getenv("PREVIEW_CACHE_ENTRIES", "256"))
+PREVIEW_BROTLI_QUALITY = int(os.getenv("PREVIEW_BROTLI_QUALITY", "11"))
+PREVIEW_MINIFY_SCRIPTS = os.getenv("PREVIEW_MINIFY_SCRIPTS", "false").lower() == "true"
+
+# Observability
+PLAYFUL_DEBUG_TIMING = os.getenv("PLAYFUL_DEBUG_TIMING", "false").lower() == "true"
+EVENT_LOOP_LAG_INTERVAL_SECS = float(os.getenv("EVENT_LOOP_LAG_INTERVAL_SECS", "0.5"))
+
 # AI Setup
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "AIzaSy_YOUR_ACTUAL_KEY_HERE")
-genai.configure(api_key=GEMINI_API_KEY)
-model_flash = genai.GenerativeModel(model_name="gemini-1.5-flash", generation_config={"response_mime_type": "application/json"})
-model_pro = genai.GenerativeModel(model_name="gemini-1.5-pro", generation_config={"response_mime_type": "application/json"})
 
-# Supabase Initialization
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-except Exception as e:
-    logging.error(f"Supabase client failed to initialize: {e}")
-    supabase = None
+# ==========================================
+# 1b. LAZY CLIENTS & WARMUP
+# ==========================================
+# Gemini and Supabase are built on first use (or by the lifespan warmup) so that
+# importing this module stays cheap for scale-to-zero cold starts.
+_CLIENTS: Dict[str, Any] = {}
+_CLIENTS_LOCK = threading.RLock()
+DEPENDENCY_STATE: Dict[str, Any] = {"warm": False, "error": None, "warmup_seconds": None}
+
+
+def _lazy_client(name: str, factory):
+    if name not in _CLIENTS:
+        with _CLIENTS_LOCK:
+            if name not in _CLIENTS:
+                _CLIENTS[name] = factory()
+    return _CLIENTS[name]
+
+
+def _configure_genai():
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai
+
+
+def get_generative_model(model_name: str, generation_config: dict, system_instruction: Optional[str] = None):
+    genai = _lazy_client("genai", _configure_genai)
+    return genai.GenerativeModel(model_name=model_name, generation_config=generation_config, system_instruction=system_instruction)
+
+
+def get_model_flash():
+    return _lazy_client("model_flash", lambda: get_generative_model("gemini-1.5-flash", {"response_mime_type": "application/json"}))
+
+
+def get_model_pro():
+    return _lazy_client("model_pro", lambda: get_generative_model("gemini-1.5-pro", {"response_mime_type": "application/json"}))
+
+
+def _create_supabase() -> Optional["Client"]:
+    from supabase import create_client
+    try:
+        return create_client(SUPABASE_URL, SUPABASE_KEY)
+    except Exception as e:
+        logging.error(f"Supabase client failed to initialize: {e}")
+        return None
+
+
+def get_supabase() -> Optional["Client"]:
+    return _lazy_client("supabase", _create_supabase)
+
+
+def warm_dependencies():
+    start = time.perf_counter()
+    try:
+        if get_supabase() is None:
+            raise RuntimeError("Supabase client unavailable")
+        get_model_flash()
+        get_model_pro()
+        DEPENDENCY_STATE.update({"warm": True, "error": None})
+    except Exception as e:
+        logging.error(f"Dependency warmup failed: {e}")
+        DEPENDENCY_STATE["error"] = str(e)
+    DEPENDENCY_STATE["warmup_seconds"] = round(time.perf_counter() - start, 3)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve liveness immediately; readiness flips once the clients are built.
+    loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+    warmup_task = asyncio.create_task(asyncio.to_thread(warm_dependencies))
+    yield
+    loop_lag_task.cancel()
+    warmup_task.cancel()
 
 # Rate Limiter & App Init
 limiter = Limiter(key_func=get_remote_address)
-app = FastAPI(title="Playable Backend - Sandbox Edition", version="8.0.0")
+app = FastAPI(title="Playable Backend - Sandbox Edition", version="8.0.0", lifespan=lifespan)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
@@ -98,6 +195,194 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+# ==========================================
+# 2b. METRICS & TRACING
+# ==========================================
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TERMINAL_JOB_STATUSES = {"Build Complete!", "failed"}
+
+
+class MetricsRegistry:
+    """Tiny in-process registry that renders counters, gauges and histograms in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._gauges: Dict[Tuple[str, tuple], float] = {}
+        self._histograms: Dict[Tuple[str, tuple], List[float]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._meta[name] = (kind, help_text)
+
+    @staticmethod
+    def _key(name: str, labels: Optional[Dict[str, str]]) -> Tuple[str, tuple]:
+        return name, tuple(sorted((labels or {}).items()))
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1.0):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        key = self._key(name, labels)
+        with self._lock:
+            # Layout: one slot per bucket, then +Inf count, then sum.
+            series = self._histograms.setdefault(key, [0.0] * (len(LATENCY_BUCKETS) + 2))
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    @staticmethod
+    def _labels(pairs: tuple, extra: tuple = ()) -> str:
+        items = list(pairs) + list(extra)
+        if not items:
+            return ""
+        escaped = []
+        for k, v in items:
+            value = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            escaped.append(f'{k}="{value}"')
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, (kind, help_text) in sorted(self._meta.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "histogram":
+                    for (metric, pairs), series in sorted(self._histograms.items()):
+                        if metric != name:
+                            continue
+                        for i, bound in enumerate(LATENCY_BUCKETS):
+                            lines.append(f"{name}_bucket{self._labels(pairs, (('le', bound),))} {series[i]:g}")
+                        lines.append(f"{name}_bucket{self._labels(pairs, (('le', '+Inf'),))} {series[-2]:g}")
+                        lines.append(f"{name}_sum{self._labels(pairs)} {series[-1]:.6f}")
+                        lines.append(f"{name}_count{self._labels(pairs)} {series[-2]:g}")
+                else:
+                    store = self._counters if kind == "counter" else self._gauges
+                    for (metric, pairs), value in sorted(store.items()):
+                        if metric == name:
+                            lines.append(f"{name}{self._labels(pairs)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+METRICS.describe("playful_http_request_duration_seconds", "histogram", "Latency of HTTP requests by route.")
+METRICS.describe("playful_http_requests_total", "counter", "HTTP requests by route and status code.")
+METRICS.describe("playful_http_request_errors_total", "counter", "HTTP requests that raised or returned 5xx.")
+METRICS.describe("playful_dependency_duration_seconds", "histogram", "Latency of calls to external services.")
+METRICS.describe("playful_dependency_errors_total", "counter", "Failed calls to external services.")
+METRICS.describe("playful_event_loop_lag_seconds", "histogram", "Scheduling delay observed on the asyncio event loop.")
+METRICS.describe("playful_event_loop_lag_last_seconds", "gauge", "Most recent event loop lag sample.")
+METRICS.describe("playful_websocket_connections", "gauge", "Open job progress WebSockets.")
+METRICS.describe("playful_job_queue_depth", "gauge", "Background jobs that have not finished or failed.")
+METRICS.describe("playful_jobs_tracked", "gauge", "Jobs currently held in the in-memory job store.")
+METRICS.describe("playful_asset_optimize_seconds", "histogram", "Time spent optimizing a Sketchfab model bundle.")
+METRICS.describe("playful_asset_bytes_saved_total", "counter", "Bytes removed from Sketchfab models before commit.")
+METRICS.describe("playful_preview_responses_total", "counter", "Sandbox preview responses by cache result and encoding.")
+
+# Spans collected for the current request; None outside of a request.
+_REQUEST_SPANS: ContextVar[Optional[List[Tuple[str, str, float]]]] = ContextVar("playful_request_spans", default=None)
+
+
+class DependencyCall:
+    """Yielded by track_dependency; HTTP callers set `failed` for error responses that don't raise."""
+    __slots__ = ("failed",)
+
+    def __init__(self):
+        self.failed = False
+
+
+@contextmanager
+def track_dependency(service: str, operation: str):
+    """Times an external call (github, supabase, gemini, sketchfab) and records errors."""
+    call = DependencyCall()
+    start = time.perf_counter()
+    try:
+        yield call
+    except Exception:
+        call.failed = True
+        raise
+    finally:
+        if call.failed:
+            METRICS.inc("playful_dependency_errors_total", {"service": service, "operation": operation})
+        elapsed = time.perf_counter() - start
+        METRICS.observe("playful_dependency_duration_seconds", elapsed, {"service": service, "operation": operation})
+        spans = _REQUEST_SPANS.get()
+        if spans is not None:
+            spans.append((service, operation, elapsed))
+
+
+def _github_operation(method: str, endpoint: str) -> str:
+    # Collapse owner/repo/path segments so label cardinality stays bounded.
+    parts = endpoint.split("?")[0].strip("/").split("/")
+    if parts[0] == "repos" and len(parts) >= 3:
+        rest = parts[3:]
+        rest = rest[:2] if rest[:1] in (["git"], ["actions"]) else rest[:1]
+        route = "/".join(["repos"] + rest)
+    else:
+        route = parts[0]
+    return f"{method} {route}"
+
+
+def _server_timing_header(spans: List[Tuple[str, str, float]], total: float) -> str:
+    grouped: Dict[Tuple[str, str], List[float]] = {}
+    for service, operation, elapsed in spans:
+        grouped.setdefault((service, operation), []).append(elapsed)
+    entries = [f"app;dur={total * 1000:.1f}"]
+    for i, ((service, operation), samples) in enumerate(grouped.items()):
+        desc = f"{operation} x{len(samples)}".replace('"', "'")
+        entries.append(f'{service}-{i};desc="{desc}";dur={sum(samples) * 1000:.1f}')
+    return ", ".join(entries)
+
+
+def _refresh_runtime_gauges():
+    METRICS.set("playful_websocket_connections", len(ACTIVE_CONNECTIONS))
+    METRICS.set("playful_jobs_tracked", len(JOB_STORE))
+    pending = sum(1 for job in list(JOB_STORE.values()) if job.get("status") not in TERMINAL_JOB_STATUSES)
+    METRICS.set("playful_job_queue_depth", pending)
+
+
+async def monitor_event_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL_SECS)
+        lag = max(0.0, loop.time() - start - EVENT_LOOP_LAG_INTERVAL_SECS)
+        METRICS.observe("playful_event_loop_lag_seconds", lag)
+        METRICS.set("playful_event_loop_lag_last_seconds", lag)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    spans: List[Tuple[str, str, float]] = []
+    token = _REQUEST_SPANS.set(spans)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        _REQUEST_SPANS.reset(token)
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        labels = {"method": request.method, "route": route}
+        METRICS.observe("playful_http_request_duration_seconds", elapsed, labels)
+        METRICS.inc("playful_http_requests_total", {**labels, "status": str(status_code)})
+        if status_code >= 500:
+            METRICS.inc("playful_http_request_errors_total", labels)
+
+    if PLAYFUL_DEBUG_TIMING and request.headers.get("x-debug-timing"):
+        response.headers["Server-Timing"] = _server_timing_header(spans, elapsed)
+    return response
+
 # ==========================================
 # 3. PYDANTIC MODELS (Strict Input Validation)
 # ==========================================
@@ -119,11 +404,18 @@ class SandboxUpdateRequest(BaseModel):
 class BuildApkRequest(BaseModel):
     project_id: str
 
+class BatchBuildApkRequest(BaseModel):
+    project_ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_BUILD_PROJECTS)
+
 # --- End Surgery 1 ---
 
 class GameRequest(BaseModel):
     game_name: str = Field(..., pattern=r"^[a-zA-Z0-9_-]+$", max_length=50)
 
+class GetChatRequest(GameRequest):
+    cursor: Optional[int] = Field(None, ge=1)
+    limit: int = Field(50, ge=1, le=CHAT_PAGE_SIZE_MAX)
+
 class EditGameNameRequest(BaseModel):
     old_game_name: str = Field(..., pattern=r"^[a-zA-Z0-9_-]+$", max_length=50)
     new_game_name: str = Field(..., pattern=r"^[a-zA-Z0-9_-]+$", max_length=50)
@@ -150,14 +442,16 @@ FavoriteRequest = ToggleFavoriteRequest
 async def verify_user(credentials: HTTPAuthorizationCredentials = Security(security)) -> dict:
     try:
         token = credentials.credentials
-        auth_res = supabase.auth.get_user(token)
+        with track_dependency("supabase", "auth.get_user"):
+            auth_res = get_supabase().auth.get_user(token)
         if not auth_res or not auth_res.user:
             raise HTTPException(status_code=401, detail="Invalid or expired token")
 
         user_id = auth_res.user.id
         email = auth_res.user.email
 
-        res = supabase.table("users").select("*").eq("id", user_id).execute()
+        with track_dependency("supabase", "users.select"):
+            res = get_supabase().table("users").select("*").eq("id", user_id).execute()
         if not res.data:
             raise HTTPException(status_code=404, detail="User profile not found")
 
@@ -200,7 +494,8 @@ async def verify_user(credentials: HTTPAuthorizationCredentials = Security(secur
                 "plan": plan,
                 "last_reset_date": str(today)
             }
-            supabase.table("users").update(updates).eq("id", user_id).execute()
+            with track_dependency("supabase", "users.update"):
+                get_supabase().table("users").update(updates).eq("id", user_id).execute()
             user.update(updates)
 
         if "game_assets" not in user or not user["game_assets"]:
@@ -208,6 +503,12 @@ async def verify_user(credentials: HTTPAuthorizationCredentials = Security(secur
         if "monetization" not in user or not user["monetization"]:
             user["monetization"] = {}
 
+        # Legacy per-user blob: move it to the chat store once, then stop carrying it around.
+        legacy_history = user.pop("chat_history", None)
+        if legacy_history:
+            # Until the blob is cleared, record_chat_turn appends to it instead of the store.
+            user["chat_migration_pending"] = not try_migrate_chat_history(user_id, legacy_history)
+
         return user
     except Exception as e:
         logging.warning(f"Failed Auth Attempt: {e}")
@@ -219,17 +520,296 @@ def sanitize_code(content: str) -> str:
     content = re.sub(r'\bnew\s+Function\s*\(', '/* new Function removed */ (', content)
     return content
 
+# ==========================================
+# 4b. CHAT HISTORY STORE
+# ==========================================
+# Messages live in chat_messages (append-only, keyed by thread) and each
+# (user, game) pair owns one chat_threads row, so renaming a game touches a
+# single row. Schema: migrations/001_chat_store.sql.
+def get_chat_thread_id(user_id: str, game_name: str, create: bool = False) -> Optional[Any]:
+    with track_dependency("supabase", "chat_threads.select"):
+        res = get_supabase().table("chat_threads").select("id").eq("user_id", user_id).eq("game_name", game_name).limit(1).execute()
+    if res.data:
+        return res.data[0]["id"]
+    if not create:
+        return None
+    with track_dependency("supabase", "chat_threads.insert"):
+        res = get_supabase().table("chat_threads").insert({"user_id": user_id, "game_name": game_name}).execute()
+    return res.data[0]["id"]
+
+
+def append_chat_messages(user_id: str, game_name: str, messages: List[dict]):
+    if not messages:
+        return
+    thread_id = get_chat_thread_id(user_id, game_name, create=True)
+    rows = [{"thread_id": thread_id, "user_id": user_id, "role": m["role"], "content": m["content"]} for m in messages]
+    with track_dependency("supabase", "chat_messages.insert"):
+        get_supabase().table("chat_messages").insert(rows).execute()
+
+
+def fetch_chat_page(user_id: str, game_name: str, cursor: Optional[int] = None, limit: int = 50) -> Tuple[List[dict], Optional[int]]:
+    """
+    Returns up to `limit` messages older than `cursor` (newest page when no cursor),
+    in chronological order, plus the cursor for the next older page or None.
+    """
+    thread_id = get_chat_thread_id(user_id, game_name)
+    if thread_id is None:
+        return [], None
+
+    query = get_supabase().table("chat_messages").select("id, role, content, created_at").eq("thread_id", thread_id)
+    if cursor is not None:
+        query = query.lt("id", cursor)
+    with track_dependency("supabase", "chat_messages.select"):
+        rows = query.order("id", desc=True).limit(limit + 1).execute().data
+
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    return list(reversed(rows[:limit])), next_cursor
+
+
+def load_recent_turns(user_id: str, game_name: str, turns: int = CHAT_CONTEXT_TURNS) -> List[dict]:
+    """Bounded prompt context for the sandbox endpoints: only the last `turns` messages are read."""
+    messages, _ = fetch_chat_page(user_id, game_name, limit=turns)
+    return messages
+
+
+def recent_turns_prompt(user_id: str, game_name: str) -> str:
+    # Context is a nicety; a chat store hiccup must not block generation.
+    try:
+        turns = load_recent_turns(user_id, game_name)
+    except Exception as e:
+        logging.warning(f"Could not load chat context for {game_name}: {e}")
+        return ""
+    if not turns:
+        return ""
+    history_text = "\n".join(f"{msg['role']}: {msg['content']}" for msg in turns)
+    return f"\n\nRECENT CONVERSATION (oldest first):\n{history_text}"
+
+
+def record_chat_turn(user: dict, game_name: str, prompt: str, reply: str):
+    # Chat is a side record of the sandbox session; never fail the generation over it.
+    turn = [{"role": "user", "content": prompt}, {"role": "assistant", "content": reply}]
+    try:
+        if user.get("chat_migration_pending"):
+            # Appending to the store now would put these turns before the legacy
+            # messages once the import lands, so keep them in the blob until then.
+            append_to_chat_history_blob(user["id"], game_name, turn)
+        else:
+            append_chat_messages(user["id"], game_name, turn)
+    except Exception as e:
+        logging.warning(f"Could not record chat turn for {game_name}: {e}")
+
+
+def append_to_chat_history_blob(user_id: str, game_name: str, messages: List[dict]):
+    with track_dependency("supabase", "users.select"):
+        res = get_supabase().table("users").select("chat_history").eq("id", user_id).execute()
+    chat_history = (res.data[0].get("chat_history") if res.data else None) or {}
+    chat_history.setdefault(game_name, []).extend(messages)
+    with track_dependency("supabase", "users.update"):
+        get_supabase().table("users").update({"chat_history": chat_history}).eq("id", user_id).execute()
+
+
+def rename_chat_thread(user_id: str, old_game_name: str, new_game_name: str):
+    """
+    Moves a thread to the new game name. A thread already under the new name
+    (left behind by a game that no longer exists on GitHub) is replaced, as the
+    old chat_history blob did; otherwise unique (user_id, game_name) would fail
+    the rename after the GitHub side has already been committed.
+    """
+    thread_id = get_chat_thread_id(user_id, old_game_name)
+    if thread_id is None:
+        return
+    with track_dependency("supabase", "chat_threads.delete"):
+        get_supabase().table("chat_threads").delete().eq("user_id", user_id).eq("game_name", new_game_name).neq("id", thread_id).execute()
+    with track_dependency("supabase", "chat_threads.update"):
+        get_supabase().table("chat_threads").update({"game_name": new_game_name}).eq("id", thread_id).execute()
+
+
+def delete_chat_thread(user_id: str, game_name: str):
+    # chat_messages rows go with it via ON DELETE CASCADE.
+    with track_dependency("supabase", "chat_threads.delete"):
+        get_supabase().table("chat_threads").delete().eq("user_id", user_id).eq("game_name", game_name).execute()
+
+
+# user_id -> (failed attempts, monotonic time of the next allowed attempt)
+_CHAT_MIGRATION_BACKOFF: Dict[str, Tuple[int, float]] = {}
+
+
+def try_migrate_chat_history(user_id: str, chat_history: Dict[str, list]) -> bool:
+    """Request-path wrapper around migrate_chat_history_blob; True once the blob is cleared."""
+    failures, retry_at = _CHAT_MIGRATION_BACKOFF.get(user_id, (0, 0.0))
+    if failures >= CHAT_MIGRATION_MAX_INLINE_ATTEMPTS or time.monotonic() < retry_at:
+        return False
+    try:
+        migrate_chat_history_blob(user_id, chat_history)
+    except Exception as e:
+        failures += 1
+        _CHAT_MIGRATION_BACKOFF[user_id] = (failures, time.monotonic() + CHAT_MIGRATION_RETRY_SECS * 2 ** (failures - 1))
+        if failures >= CHAT_MIGRATION_MAX_INLINE_ATTEMPTS:
+            logging.warning(f"Chat history migration for user {user_id} failed {failures} times; leaving it to the backfill: {e}")
+        else:
+            logging.warning(f"Chat history migration failed for user {user_id}: {e}")
+        return False
+    _CHAT_MIGRATION_BACKOFF.pop(user_id, None)
+    return True
+
+
+def migrate_chat_history_blob(user_id: str, chat_history: Dict[str, list]):
+    """
+    Copies a legacy users.chat_history blob into the chat store and clears the blob.
+    Each game is imported by the import_chat_history RPC (migrations/002), which
+    writes the thread, its messages and the history_imported flag in one
+    transaction, so a game is only skipped once it has fully landed. The blob is
+    kept until every game has been imported; failures raise after the loop.
+    """
+    failed = []
+    for game_name, messages in chat_history.items():
+        valid = [
+            {"role": m["role"], "content": m["content"]}
+            for m in messages or []
+            if isinstance(m, dict) and isinstance(m.get("role"), str) and m.get("content") is not None
+        ]
+        if not valid:
+            continue
+        try:
+            with track_dependency("supabase", "rpc.import_chat_history"):
+                get_supabase().rpc("import_chat_history", {"p_user_id": user_id, "p_game_name": game_name, "p_messages": valid}).execute()
+        except Exception as e:
+            logging.warning(f"Chat history for {game_name} not imported: {e}")
+            failed.append(game_name)
+
+    if failed:
+        raise Exception(f"Chat history import failed for {len(failed)} game(s): {', '.join(failed)}")
+
+    with track_dependency("supabase", "users.update"):
+        get_supabase().table("users").update({"chat_history": None}).eq("id", user_id).execute()
+    logging.info(f"Migrated chat history for user {user_id} ({len(chat_history)} game(s))")
+
+# ==========================================
+# 4c. SANDBOX PREVIEW CACHE
+# ==========================================
+# sandbox_code is served as plain HTML by /api/sandbox/preview. Its sha256 is
+# stored next to it as game_assets["sandbox_etag"], and the identity/gzip/br
+# bodies are built once per hash (when the code is saved, or on the first
+# request after a restart) and kept in a small per-process LRU.
+try:
+    import brotli
+except ImportError:  # previews fall back to gzip
+    brotli = None
+
+_PREVIEW_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_PREVIEW_CACHE_LOCK = threading.Lock()
+_INLINE_SCRIPT = re.compile(r"(<script\b[^>]*>)(.*?)(</script\s*>)", re.IGNORECASE | re.DOTALL)
+_SCRIPT_TYPE = re.compile(r"""\btype\s*=\s*["']?([^"'\s>]+)""", re.IGNORECASE)
+JS_SCRIPT_TYPES = {"text/javascript", "application/javascript", "module"}
+
+
+def sandbox_etag(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def minify_inline_scripts(html: str) -> str:
+    """
+    Strips indentation, blank lines and whole-line // comments from inline JS.
+    Lines are never joined, so automatic semicolon insertion is unaffected.
+    Scripts using template literals or line continuations are left untouched
+    because their whitespace can be part of a string. A // line that contains
+    */ is kept: inside a block comment that is where the comment ends, and
+    code may follow it on the same line.
+    """
+    def shrink(match: re.Match) -> str:
+        open_tag, body, close_tag = match.groups()
+        script_type = _SCRIPT_TYPE.search(open_tag)
+        if "src=" in open_tag.lower() or (script_type and script_type.group(1).lower() not in JS_SCRIPT_TYPES):
+            return match.group(0)
+        lines = [line.strip() for line in body.splitlines()]
+        if "`" in body or any(line.endswith("\\") for line in lines):
+            return match.group(0)
+        kept = [line for line in lines if line and not (line.startswith("//") and "*/" not in line)]
+        return open_tag + "\n".join(kept) + close_tag
+
+    return _INLINE_SCRIPT.sub(shrink, html)
+
+
+def build_preview_variants(code: str) -> Dict[str, Any]:
+    """CPU-bound (brotli at quality 11); call via asyncio.to_thread."""
+    body = (minify_inline_scripts(code) if PREVIEW_MINIFY_SCRIPTS else code).encode("utf-8")
+    variants = {"hash": sandbox_etag(code), "identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, mode=brotli.MODE_TEXT, quality=PREVIEW_BROTLI_QUALITY)
+    return variants
+
+
+def cache_preview(project_id: str, variants: Dict[str, Any]):
+    with _PREVIEW_CACHE_LOCK:
+        _PREVIEW_CACHE[project_id] = variants
+        _PREVIEW_CACHE.move_to_end(project_id)
+        while len(_PREVIEW_CACHE) > PREVIEW_CACHE_ENTRIES:
+            _PREVIEW_CACHE.popitem(last=False)
+
+
+def cached_preview(project_id: str, content_hash: str) -> Optional[Dict[str, Any]]:
+    with _PREVIEW_CACHE_LOCK:
+        variants = _PREVIEW_CACHE.get(project_id)
+        if variants is None or variants["hash"] != content_hash:
+            return None
+        _PREVIEW_CACHE.move_to_end(project_id)
+        return variants
+
+
+async def store_sandbox_preview(project_id: str, game_assets: dict, code: str) -> str:
+    """Sets sandbox_code/sandbox_etag on game_assets and precompresses the preview; returns the hash."""
+    variants = await asyncio.to_thread(build_preview_variants, code)
+    cache_preview(project_id, variants)
+    game_assets["sandbox_code"] = code
+    game_assets["sandbox_etag"] = variants["hash"]
+    return variants["hash"]
+
+
+def preview_etag(content_hash: str, encoding: str) -> str:
+    # Each content-coding gets its own strong tag; minified bodies differ from raw ones too.
+    tag = content_hash + ("-min" if PREVIEW_MINIFY_SCRIPTS else "")
+    return f'"{tag}"' if encoding == "identity" else f'"{tag}-{encoding}"'
+
+
+def preview_etag_matches(if_none_match: Optional[str], content_hash: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {preview_etag(content_hash, encoding) for encoding in ("identity", "gzip", "br")}
+    return any(tag.strip().removeprefix("W/") in candidates for tag in if_none_match.split(","))
+
+
+def negotiate_preview_encoding(accept_encoding: Optional[str]) -> str:
+    weights: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.partition(";")
+        match = re.search(r"q\s*=\s*([0-9.]+)", params)
+        try:
+            weights[coding.strip().lower()] = float(match.group(1)) if match else 1.0
+        except ValueError:
+            continue
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
 # ==========================================
 # 5. GITHUB & SKETCHFAB CORE LOGIC
 # ==========================================
 async def github_api(method: str, endpoint: str, json_data: dict = None, return_status: bool = False):
-    url = f"https://api.github.com{endpoint}"
+    url = f"{GITHUB_API_URL}{endpoint}"
     headers = {
         "Authorization": f"Bearer {PLAYFUL_GH_TOKEN}",
         "Accept": "application/vnd.github.v3+json"
     }
     async with httpx.AsyncClient() as client:
-        resp = await client.request(method, url, headers=headers, json=json_data, timeout=30.0)
+        with track_dependency("github", _github_operation(method, endpoint)) as call:
+            resp = await client.request(method, url, headers=headers, json=json_data, timeout=30.0)
+            # return_status callers probe with 404s on purpose; only server errors and rate limits count there.
+            call.failed = resp.status_code >= 500 or resp.status_code == 429 or (not return_status and resp.status_code >= 400)
         if return_status:
             return resp.status_code, resp.json() if resp.text else {}
         if resp.status_code >= 400:
@@ -274,6 +854,25 @@ async def commit_files_to_github(username: str, game_name: str, files: list, is_
     await github_api("PATCH", f"{repo_path}/git/refs/heads/main", {"sha": new_commit["sha"]})
 
 
+async def delete_tree_from_github(username: str, path: str):
+    """Removes everything under `path` in a single commit (nested folders included)."""
+    repo_path = f"/repos/{GITHUB_OWNER}/{username}"
+    ref_data = await github_api("GET", f"{repo_path}/git/ref/heads/main")
+    base_sha = ref_data["object"]["sha"]
+    commit_data = await github_api("GET", f"{repo_path}/git/commits/{base_sha}")
+    tree_sha = commit_data["tree"]["sha"]
+
+    tree = await github_api("GET", f"{repo_path}/git/trees/{tree_sha}?recursive=1")
+    doomed = [item["path"] for item in tree.get("tree", []) if item["type"] == "blob" and item["path"].startswith(f"{path}/")]
+    if not doomed:
+        return
+
+    tree_items = [{"path": item_path, "mode": "100644", "type": "blob", "sha": None} for item_path in doomed]
+    new_tree = await github_api("POST", f"{repo_path}/git/trees", {"base_tree": tree_sha, "tree": tree_items})
+    new_commit = await github_api("POST", f"{repo_path}/git/commits", {"message": f"Clean up {path}", "tree": new_tree["sha"], "parents": [base_sha]})
+    await github_api("PATCH", f"{repo_path}/git/refs/heads/main", {"sha": new_commit["sha"]})
+
+
 async def delete_folder_from_github(username: str, game_name: str):
     status, files = await github_api("GET", f"/repos/{GITHUB_OWNER}/{username}/contents/{game_name}", return_status=True)
     if status == 200 and isinstance(files, list):
@@ -282,12 +881,18 @@ async def delete_folder_from_github(username: str, game_name: str):
             await github_api("DELETE", f"/repos/{GITHUB_OWNER}/{username}/contents/{file['path']}", json_data=payload)
 
 
-async def process_and_upload_assets(job_id: str, username: str, game_name: str, uids: List[str]) -> List[str]:
+async def process_and_upload_assets(job_id: Optional[str], username: str, game_name: str, uids: List[str]) -> Tuple[List[str], List[dict]]:
+    # Cold path: only needed when a user picks Sketchfab models.
+    from asset_optimizer import optimize_asset_bundle
+
     asset_urls = []
+    reports = []
     headers = {"Authorization": f"Token {SKETCHFAB_API_TOKEN}"}
     async with httpx.AsyncClient(follow_redirects=True) as client:
         for uid in uids:
-            dl_res = await client.get(f"https://api.sketchfab.com/v3/models/{uid}/download", headers=headers)
+            with track_dependency("sketchfab", "models.download") as call:
+                dl_res = await client.get(f"{SKETCHFAB_API_URL}/models/{uid}/download", headers=headers)
+                call.failed = dl_res.status_code != 200
             if dl_res.status_code != 200:
                 continue
 
@@ -296,24 +901,40 @@ async def process_and_upload_assets(job_id: str, username: str, game_name: str,
             if not zip_url:
                 continue
 
-            zip_res = await client.get(zip_url)
-            with zipfile.ZipFile(io.BytesIO(zip_res.content)) as z:
-                files_to_push = []
-                for file_info in z.infolist():
-                    if file_info.is_dir():
-                        continue
-                    encoded = base64.b64encode(z.read(file_info.filename)).decode('utf-8')
-                    clean_name = os.path.basename(file_info.filename)
-                    files_to_push.append({"path": f"assets/{uid}_{clean_name}", "content": encoded})
-                    if clean_name.endswith('.glb') or clean_name.endswith('.gltf'):
-                        asset_urls.append(f"https://raw.githubusercontent.com/{GITHUB_OWNER}/{username}/main/{game_name}/assets/{uid}_{clean_name}")
-                if files_to_push:
-                    await commit_files_to_github(username, game_name, files_to_push, is_binary=True)
-    return asset_urls
+            with track_dependency("sketchfab", "archive.fetch") as call:
+                zip_res = await client.get(zip_url)
+                call.failed = zip_res.status_code != 200
+            if zip_res.status_code != 200:
+                continue
+
+            # Shrink textures and drop dead weight before anything reaches the repo (cached per input hash).
+            start = time.perf_counter()
+            files, report = await asyncio.to_thread(optimize_asset_bundle, uid, zip_res.content)
+            METRICS.observe("playful_asset_optimize_seconds", time.perf_counter() - start, {"cached": str(report.cached).lower()})
+            METRICS.inc("playful_asset_bytes_saved_total", value=report.saved_bytes)
+            reports.append(report.to_dict())
+            logging.info(
+                f"Optimized Sketchfab model {uid}: {report.original_bytes} -> {report.optimized_bytes} bytes "
+                f"({report.to_dict()['saved_percent']}% saved{', cached' if report.cached else ''})"
+            )
+            # Progress only goes to a real job's socket; sandbox calls pass job_id=None.
+            if job_id:
+                await manager.send_update(job_id, "Optimizing", f"Optimized model {uid}: saved {report.saved_bytes // 1024} KB", {"asset_reports": reports})
+
+            files_to_push = []
+            for filename, content in files.items():
+                encoded = base64.b64encode(content).decode('utf-8')
+                clean_name = os.path.basename(filename)
+                files_to_push.append({"path": f"assets/{uid}_{clean_name}", "content": encoded})
+                if clean_name.endswith('.glb') or clean_name.endswith('.gltf'):
+                    asset_urls.append(f"https://raw.githubusercontent.com/{GITHUB_OWNER}/{username}/main/{game_name}/assets/{uid}_{clean_name}")
+            if files_to_push:
+                await commit_files_to_github(username, game_name, files_to_push, is_binary=True)
+    return asset_urls, reports
 
 
 async def generate_game_with_ai(prompt: str, history: list, game_name: str, current_code: str, asset_urls: List[str]) -> dict:
-    history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in history[-8:]])
+    history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in history[-CHAT_CONTEXT_TURNS:]])
 
     code_marker = "`" * 3
     if current_code:
@@ -332,7 +953,8 @@ async def generate_game_with_ai(prompt: str, history: list, game_name: str, curr
     History:\n{history_text}"""
 
     try:
-        response = await model_pro.generate_content_async(prompt, tools=[{"function_declarations": []}], request_options={"system_instruction": sys_instr})
+        with track_dependency("gemini", "gemini-1.5-pro.json"):
+            response = await get_model_pro().generate_content_async(prompt, tools=[{"function_declarations": []}], request_options={"system_instruction": sys_instr})
         raw_text = response.text.strip()
 
         json_prefix = "`" * 3 + "json"
@@ -346,6 +968,10 @@ async def generate_game_with_ai(prompt: str, history: list, game_name: str, curr
 # ==========================================
 # 6. WORKFLOWS
 # ==========================================
+async def build_pause(seconds: float):
+    await asyncio.sleep(seconds * BUILD_PACING_SCALE)
+
+
 async def build_apk_workflow(job_id: str, req: BuildApkRequest, user: dict):
     try:
         is_free_user = user.get("plan", "free") == "free"
@@ -363,7 +989,8 @@ async def build_apk_workflow(job_id: str, req: BuildApkRequest, user: dict):
             raise Exception("Insufficient credits for APK build.")
 
         # Fetch sandbox_code from Supabase projects table
-        project_res = supabase.table("projects").select("game_assets, game_name").eq("id", req.project_id).eq("user_id", user["id"]).execute()
+        with track_dependency("supabase", "projects.select"):
+            project_res = get_supabase().table("projects").select("game_assets, game_name").eq("id", req.project_id).eq("user_id", user["id"]).execute()
         if not project_res.data:
             raise Exception("Project not found or access denied.")
 
@@ -389,10 +1016,11 @@ async def build_apk_workflow(job_id: str, req: BuildApkRequest, user: dict):
             final_ad_interval = user.get("admob_interval") or "10"
             watermark_enabled = "false"
 
-        supabase.table("users").update({
-            "builds": user["builds"] - 1,
-            "credits": user["credits"] - build_cost
-        }).eq("id", user["id"]).execute()
+        with track_dependency("supabase", "users.update"):
+            get_supabase().table("users").update({
+                "builds": user["builds"] - 1,
+                "credits": user["credits"] - build_cost
+            }).eq("id", user["id"]).execute()
 
         # Push sandbox_code to builder repo's www/index.html
         await manager.send_update(job_id, "Uploading", "Pushing your game code to the build pipeline... 📦", {"progress": 15})
@@ -412,51 +1040,54 @@ async def build_apk_workflow(job_id: str, req: BuildApkRequest, user: dict):
             put_payload["sha"] = existing_sha
 
         async with httpx.AsyncClient() as client:
-            gh_url = f"https://api.github.com{file_endpoint}"
+            gh_url = f"{GITHUB_API_URL}{file_endpoint}"
             gh_headers = {
                 "Authorization": f"Bearer {PLAYFUL_GH_TOKEN}",
                 "Accept": "application/vnd.github.v3+json"
             }
-            put_resp = await client.put(gh_url, headers=gh_headers, json=put_payload, timeout=30.0)
+            with track_dependency("github", _github_operation("PUT", file_endpoint)) as call:
+                put_resp = await client.put(gh_url, headers=gh_headers, json=put_payload, timeout=30.0)
+                call.failed = put_resp.status_code >= 400
             if put_resp.status_code >= 400:
                 raise Exception(f"GitHub file push failed: {put_resp.text}")
 
         # Update project status in Supabase to BUILDING
-        supabase.table("projects").update({"status": "BUILDING"}).eq("id", req.project_id).execute()
+        with track_dependency("supabase", "projects.update"):
+            get_supabase().table("projects").update({"status": "BUILDING"}).eq("id", req.project_id).execute()
 
-        await asyncio.sleep(5)
+        await build_pause(5)
         await manager.send_update(job_id, "Fetching Code", "Downloading your 3D universe... 🌌", {"progress": 20})
-        await asyncio.sleep(15)
+        await build_pause(15)
 
         if is_free_user:
             await manager.send_update(job_id, "Watermark", "Applying the Playful Watermark... 💧", {"progress": 35})
         else:
             await manager.send_update(job_id, "Watermark", "Stripping all watermarks for Pro Build... 🚫💧", {"progress": 35})
 
-        await asyncio.sleep(10)
+        await build_pause(10)
 
         if is_free_user:
             await manager.send_update(job_id, "Monetization", "Wiring up the Playful Ad Network... 💸", {"progress": 50})
         else:
             await manager.send_update(job_id, "Monetization", "Injecting YOUR custom AdMob IDs... 💰", {"progress": 50})
 
-        await asyncio.sleep(15)
+        await build_pause(15)
         await manager.send_update(job_id, "Capacitor", "Forging the native Android shell... 🛡️", {"progress": 65})
-        await asyncio.sleep(20)
+        await build_pause(20)
 
         if is_free_user:
             await manager.send_update(job_id, "Compiling", "Compiling Gradle code (Grab a coffee, this takes a minute ☕)...", {"progress": 80})
         else:
             await manager.send_update(job_id, "Compiling", "Compiling High-Speed Native Code... ⚡", {"progress": 80})
 
-        await asyncio.sleep(40)
+        await build_pause(40)
 
         if is_free_user:
             await manager.send_update(job_id, "Finalizing", "Signing and polishing the final APK... ✨", {"progress": 95})
         else:
             await manager.send_update(job_id, "Finalizing", "Signing your custom App Bundle... ✨", {"progress": 95})
 
-        await asyncio.sleep(15)
+        await build_pause(15)
 
         apk_url = f"https://github.com/{GITHUB_OWNER}/{PLAYFUL_BUILDER_REPO}/releases/download/latest-{user['username']}-{game_name}/{game_name}.apk"
 
@@ -468,13 +1099,214 @@ async def build_apk_workflow(job_id: str, req: BuildApkRequest, user: dict):
     except Exception as e:
         await manager.send_update(job_id, "failed", str(e))
 
+
+def build_folder_name(game_name: str, taken: set) -> str:
+    # Folder doubles as the Capacitor app id suffix and release tag, so keep it to [A-Za-z0-9_]
+    # and start it with a letter (com.playful.2048 is not a valid Android package).
+    base = re.sub(r"[^A-Za-z0-9_]", "_", game_name).strip("_") or "game"
+    if base[0].isdigit():
+        base = f"g_{base}"
+    folder, n = base, 2
+    while folder in taken:
+        folder, n = f"{base}_{n}", n + 1
+    taken.add(folder)
+    return folder
+
+
+def batch_job_progress(job: Optional[dict]) -> Optional[int]:
+    """Maps a GitHub Actions job onto 0-100; None once it has failed."""
+    if not job or job.get("status") in ("queued", "waiting", "pending", "requested"):
+        return 5
+    if job.get("status") == "completed":
+        return 100 if job.get("conclusion") == "success" else None
+    steps = job.get("steps") or []
+    done = sum(1 for step in steps if step.get("status") == "completed")
+    return 10 + int(85 * done / len(steps)) if steps else 10
+
+
+async def poll_github(endpoint: str) -> Optional[dict]:
+    """GET for long-running polls: transient failures are logged and return None so the caller retries."""
+    try:
+        status, data = await github_api("GET", endpoint, return_status=True)
+    except (httpx.HTTPError, ValueError) as e:
+        logging.warning(f"GitHub poll of {endpoint} failed: {e}")
+        return None
+    if status != 200:
+        logging.warning(f"GitHub poll of {endpoint} returned {status}")
+        return None
+    return data
+
+
+async def wait_for_run_completion(repo_path: str, run_id: int, deadline: float) -> bool:
+    """True once the workflow run reports status "completed"; False if the deadline passes first."""
+    while True:
+        run = await poll_github(f"{repo_path}/actions/runs/{run_id}")
+        if run and run.get("status") == "completed":
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(BATCH_POLL_INTERVAL_SECS)
+
+
+async def batch_build_apk_workflow(job_id: str, project_ids: List[str], user: dict):
+    """
+    Builds many projects with one staging commit and one matrix workflow run:
+    every project's sandbox_code goes to builds/<batch_id>/<folder>/index.html in the
+    builder repo, build_apk_batch.yml fans out one matrix job per folder, and each
+    job's state is mirrored into JOB_STORE[job_id]["projects"].
+    """
+    projects_state: Dict[str, dict] = JOB_STORE[job_id]["projects"]
+    batch_id = job_id.split("-")[0]
+    repo_path = f"/repos/{GITHUB_OWNER}/{PLAYFUL_BUILDER_REPO}"
+    staged = dispatched = False
+    run_id = None
+    deadline = time.monotonic() + BATCH_BUILD_TIMEOUT_SECS
+    try:
+        is_free_user = user.get("plan", "free") == "free"
+        count = len(project_ids)
+        await manager.send_update(job_id, "Initializing", f"Lining up {count} games for the build pipeline... 🚀", {"progress": 0})
+
+        if user.get("builds", 0) < count:
+            raise Exception(f"Insufficient APK build limits for {count} builds. Please upgrade.")
+
+        build_cost = (5 if is_free_user else 10) * count
+        if user.get("credits", 0) < build_cost:
+            raise Exception("Insufficient credits for this batch build.")
+
+        with track_dependency("supabase", "projects.select"):
+            project_res = get_supabase().table("projects").select("id, game_assets, game_name").in_("id", project_ids).eq("user_id", user["id"]).execute()
+        found = {row["id"]: row for row in project_res.data or []}
+        missing = [pid for pid in project_ids if pid not in found]
+        if missing:
+            raise Exception(f"Projects not found or access denied: {', '.join(missing)}")
+        no_code = [pid for pid in project_ids if not (found[pid].get("game_assets") or {}).get("sandbox_code")]
+        if no_code:
+            raise Exception(f"No sandbox code found for: {', '.join(no_code)}. Generate a preview first.")
+
+        if is_free_user:
+            ad_inputs = {
+                "admob_banner": PLAYFUL_DEFAULT_BANNER_ID,
+                "admob_interstitial": PLAYFUL_DEFAULT_INTERSTITIAL_ID,
+                "ad_interval_minutes": PLAYFUL_AD_INTERVAL_MINS,
+                "watermark": "true",
+            }
+        else:
+            ad_inputs = {
+                "admob_banner": user.get("admob_banner") or "",
+                "admob_interstitial": user.get("admob_interstitial") or "",
+                "ad_interval_minutes": user.get("admob_interval") or "10",
+                "watermark": "false",
+            }
+
+        with track_dependency("supabase", "users.update"):
+            get_supabase().table("users").update({
+                "builds": user["builds"] - count,
+                "credits": user["credits"] - build_cost
+            }).eq("id", user["id"]).execute()
+
+        # Stage every project's code in a single commit on the builder repo
+        await manager.send_update(job_id, "Uploading", f"Pushing {count} games to the build pipeline in one go... 📦", {"progress": 5})
+        taken: set = set()
+        folders: Dict[str, str] = {}
+        files = []
+        for pid in project_ids:
+            folder = build_folder_name(found[pid].get("game_name") or pid, taken)
+            folders[pid] = folder
+            projects_state[pid].update({"game_name": found[pid].get("game_name", pid), "folder": folder})
+            # Pushed byte-for-byte (no sanitize_code), same as the single /api/build/apk path
+            encoded = base64.b64encode(found[pid]["game_assets"]["sandbox_code"].encode("utf-8")).decode("utf-8")
+            files.append({"path": f"{folder}/index.html", "content": encoded})
+        await commit_files_to_github(PLAYFUL_BUILDER_REPO, f"builds/{batch_id}", files, is_binary=True)
+        staged = True
+
+        with track_dependency("supabase", "projects.update"):
+            get_supabase().table("projects").update({"status": "BUILDING"}).in_("id", project_ids).execute()
+
+        # One workflow run, one matrix job per game
+        matrix = [{"folder": folders[pid], "project_id": pid} for pid in project_ids]
+        await github_api("POST", f"{repo_path}/actions/workflows/{BATCH_BUILD_WORKFLOW}/dispatches", {
+            "ref": "main",
+            "inputs": {
+                "owner": GITHUB_OWNER,
+                "repo": PLAYFUL_BUILDER_REPO,
+                "username": user["username"],
+                "batch_id": batch_id,
+                "projects": json.dumps(matrix),
+                **ad_inputs,
+            },
+        })
+        dispatched = True
+        await manager.send_update(job_id, "Dispatched", "Build matrix queued on the runners... ⏳", {"progress": 10})
+
+        last_snapshot = None
+        while time.monotonic() < deadline:
+            await asyncio.sleep(BATCH_POLL_INTERVAL_SECS)
+            if run_id is None:
+                runs = await poll_github(f"{repo_path}/actions/workflows/{BATCH_BUILD_WORKFLOW}/runs?event=workflow_dispatch&per_page=20")
+                run = next((r for r in (runs or {}).get("workflow_runs", []) if batch_id in (r.get("display_title") or r.get("name") or "")), None)
+                if not run:
+                    continue
+                run_id = run["id"]
+
+            jobs = await poll_github(f"{repo_path}/actions/runs/{run_id}/jobs?per_page=100")
+            if jobs is None:
+                continue
+            jobs_by_name = {job.get("name"): job for job in jobs.get("jobs", [])}
+            for pid in project_ids:
+                progress = batch_job_progress(jobs_by_name.get(folders[pid]))
+                if progress is None:
+                    projects_state[pid].update({"status": "failed", "progress": 100})
+                elif progress == 100:
+                    apk_url = f"https://github.com/{GITHUB_OWNER}/{PLAYFUL_BUILDER_REPO}/releases/download/latest-{user['username']}-{folders[pid]}/{folders[pid]}.apk"
+                    projects_state[pid].update({"status": "complete", "progress": 100, "apk_url": apk_url})
+                else:
+                    projects_state[pid].update({"status": "building" if progress > 5 else "queued", "progress": progress})
+
+            snapshot = json.dumps(projects_state, sort_keys=True)
+            if snapshot == last_snapshot:
+                continue
+            last_snapshot = snapshot
+
+            finished = [p for p in projects_state.values() if p["status"] in ("complete", "failed")]
+            overall = 10 + int(90 * sum(p["progress"] for p in projects_state.values()) / (100 * count))
+            if len(finished) < count:
+                await manager.send_update(job_id, "Compiling", f"{len(finished)}/{count} games built... ⚙️", {"progress": min(overall, 99), "projects": projects_state})
+                continue
+
+            succeeded = sum(1 for p in finished if p["status"] == "complete")
+            if succeeded == 0:
+                raise Exception("Every build in the batch failed.")
+            await manager.send_update(job_id, "Build Complete!", f"{succeeded}/{count} Android games ready! 🎮", {"progress": 100, "projects": projects_state})
+            return
+
+        raise Exception("Batch build timed out waiting for GitHub Actions.")
+
+    except Exception as e:
+        for state in projects_state.values():
+            if state.get("status") not in ("complete", "failed"):
+                state["status"] = "failed"
+        await manager.send_update(job_id, "failed", str(e), {"projects": projects_state})
+
+    finally:
+        # Queued matrix jobs still need to clone builds/<batch_id>, so only remove it once
+        # nothing can read it: never dispatched, or the run itself reports completed.
+        if staged:
+            try:
+                if not dispatched or (run_id is not None and await wait_for_run_completion(repo_path, run_id, deadline)):
+                    await delete_tree_from_github(PLAYFUL_BUILDER_REPO, f"builds/{batch_id}")
+                else:
+                    logging.warning(f"Leaving builds/{batch_id} in place: workflow run {run_id} has not completed")
+            except Exception as e:
+                logging.warning(f"Could not clean up builds/{batch_id}: {e}")
+
 # ==========================================
 # SURGERY 2: SUPABASE STORAGE HELPER
 # ==========================================
 def save_model_to_bucket(file_bytes: bytes, filename: str) -> str:
     file_path = f"assets/{uuid.uuid4()}_{filename}"
-    supabase.storage.from_("playful-bucket").upload(file_path, file_bytes)
-    return supabase.storage.from_("playful-bucket").get_public_url(file_path)
+    with track_dependency("supabase", "storage.upload"):
+        get_supabase().storage.from_("playful-bucket").upload(file_path, file_bytes)
+    return get_supabase().storage.from_("playful-bucket").get_public_url(file_path)
 
 # ==========================================
 # 7. SECURE REST API ENDPOINTS
@@ -485,11 +1317,33 @@ async def health_check(request: Request):
     return {"status": "securely locked 🔒", "timestamp": datetime.utcnow().isoformat()}
 
 
+@app.get("/livez")
+async def liveness_check():
+    """Process is up and serving; says nothing about Supabase/Gemini."""
+    return {"status": "up"}
+
+
+@app.get("/readyz")
+async def readiness_check():
+    """200 once the lifespan warmup has built every client, 503 until then."""
+    if DEPENDENCY_STATE["warm"]:
+        return {"status": "ready", **DEPENDENCY_STATE}
+    return JSONResponse(status_code=503, content={"status": "warming" if not DEPENDENCY_STATE["error"] else "degraded", **DEPENDENCY_STATE})
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus scrape target: request/dependency latency, errors, loop lag, sockets and job depth."""
+    _refresh_runtime_gauges()
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/search-assets")
 @limiter.limit("10/minute")
 async def api_search_assets(request: Request, req: AssetSearchRequest, user: dict = Depends(verify_user)):
     try:
-        res = await model_flash.generate_content_async(f"Extract 1-3 primary 3D objects from: '{req.prompt}'. Return JSON array of strings.")
+        with track_dependency("gemini", "gemini-1.5-flash.keywords"):
+            res = await get_model_flash().generate_content_async(f"Extract 1-3 primary 3D objects from: '{req.prompt}'. Return JSON array of strings.")
         keywords = json.loads(res.text.strip("`").replace("json\n", ""))
     except:
         keywords = ["character", "environment"]
@@ -504,7 +1358,9 @@ async def api_search_assets(request: Request, req: AssetSearchRequest, user: dic
                 "q": keyword,
                 "sort_by": "-relevance"
             }
-            res = await client.get("https://api.sketchfab.com/v3/search", params=params)
+            with track_dependency("sketchfab", "search") as call:
+                res = await client.get(f"{SKETCHFAB_API_URL}/search", params=params)
+                call.failed = res.status_code != 200
             if res.status_code == 200:
                 models = []
                 for item in res.json().get("results", [])[:5]:
@@ -532,7 +1388,8 @@ async def api_sandbox_generate(request: Request, req: SandboxGenerateRequest, us
     """
     try:
         # Fetch the project from Supabase to verify ownership and get existing assets
-        project_res = supabase.table("projects").select("*").eq("id", req.project_id).eq("user_id", user["id"]).execute()
+        with track_dependency("supabase", "projects.select"):
+            project_res = get_supabase().table("projects").select("*").eq("id", req.project_id).eq("user_id", user["id"]).execute()
         if not project_res.data:
             raise HTTPException(status_code=404, detail="Project not found or access denied.")
 
@@ -545,10 +1402,11 @@ async def api_sandbox_generate(request: Request, req: SandboxGenerateRequest, us
         # Sketchfab, push them to GitHub, and collect their raw CDN URLs so the
         # AI can reference them directly inside the Babylon.js SceneLoader calls.
         asset_urls: List[str] = game_assets.get("asset_urls", [])
+        asset_reports: List[dict] = []
         if req.selected_uids:
             logging.info(f"Downloading {len(req.selected_uids)} Sketchfab model(s) for project {req.project_id}")
-            new_urls = await process_and_upload_assets(
-                "sandbox",            # placeholder job_id — no WebSocket needed here
+            new_urls, asset_reports = await process_and_upload_assets(
+                None,                 # no job — nothing to push over a WebSocket
                 user["username"],
                 game_name,
                 req.selected_uids
@@ -572,22 +1430,31 @@ async def api_sandbox_generate(request: Request, req: SandboxGenerateRequest, us
             "Include all JavaScript inline. Do NOT wrap your response in JSON or markdown — return raw HTML only."
         )
         generation_config_raw = {"response_mime_type": "text/plain"}
-        model_raw = genai.GenerativeModel(
+        model_raw = get_generative_model(
             model_name="gemini-1.5-pro",
             generation_config=generation_config_raw,
             system_instruction=system_instruction
         )
 
-        full_prompt = req.prompt + asset_hint
-        response = await model_raw.generate_content_async(full_prompt)
+        full_prompt = req.prompt + asset_hint + recent_turns_prompt(user["id"], game_name)
+        with track_dependency("gemini", "gemini-1.5-pro.sandbox_generate"):
+            response = await model_raw.generate_content_async(full_prompt)
         raw_code: str = response.text.strip()
 
         # Inject sandbox_code into game_assets and persist to Supabase
-        game_assets["sandbox_code"] = raw_code
-        supabase.table("projects").update({"game_assets": game_assets}).eq("id", req.project_id).execute()
+        etag = await store_sandbox_preview(req.project_id, game_assets, raw_code)
+        with track_dependency("supabase", "projects.update"):
+            get_supabase().table("projects").update({"game_assets": game_assets}).eq("id", req.project_id).execute()
 
+        record_chat_turn(user, game_name, req.prompt, "Generated a new sandbox preview.")
         logging.info(f"Sandbox code generated for project {req.project_id} by user {user['id']}")
-        return {"status": "success", "sandbox_code": raw_code}
+        return {
+            "status": "success",
+            "sandbox_code": raw_code,
+            "sandbox_etag": etag,
+            "preview_url": f"/api/sandbox/preview/{req.project_id}",
+            "asset_optimization": asset_reports,
+        }
 
     except HTTPException:
         raise
@@ -605,11 +1472,13 @@ async def api_sandbox_update(request: Request, req: SandboxUpdateRequest, user:
     in Supabase and returns the updated code for live preview. Does NOT touch GitHub.
     """
     try:
-        project_res = supabase.table("projects").select("game_assets").eq("id", req.project_id).eq("user_id", user["id"]).execute()
+        with track_dependency("supabase", "projects.select"):
+            project_res = get_supabase().table("projects").select("game_assets, game_name").eq("id", req.project_id).eq("user_id", user["id"]).execute()
         if not project_res.data:
             raise HTTPException(status_code=404, detail="Project not found or access denied.")
 
         game_assets: dict = project_res.data[0].get("game_assets") or {}
+        game_name: str = project_res.data[0].get("game_name", req.project_id)
         existing_code: str = game_assets.get("sandbox_code", "")
 
         if not existing_code:
@@ -622,7 +1491,7 @@ async def api_sandbox_update(request: Request, req: SandboxUpdateRequest, user:
             "Do NOT wrap your response in JSON or markdown — return raw HTML only."
         )
         generation_config_raw = {"response_mime_type": "text/plain"}
-        model_raw = genai.GenerativeModel(
+        model_raw = get_generative_model(
             model_name="gemini-1.5-pro",
             generation_config=generation_config_raw,
             system_instruction=system_instruction
@@ -631,16 +1500,27 @@ async def api_sandbox_update(request: Request, req: SandboxUpdateRequest, user:
         combined_prompt = (
             f"EXISTING CODE:\n{existing_code}\n\n"
             f"UPDATE INSTRUCTION:\n{req.new_prompt}"
+            f"{recent_turns_prompt(user['id'], game_name)}"
         )
 
-        response = await model_raw.generate_content_async(combined_prompt)
+        with track_dependency("gemini", "gemini-1.5-pro.sandbox_update"):
+            response = await model_raw.generate_content_async(combined_prompt)
         updated_code: str = response.text.strip()
 
-        game_assets["sandbox_code"] = updated_code
-        supabase.table("projects").update({"game_assets": game_assets}).eq("id", req.project_id).execute()
+        previous_etag = game_assets.get("sandbox_etag")
+        etag = await store_sandbox_preview(req.project_id, game_assets, updated_code)
+        if etag != previous_etag:
+            with track_dependency("supabase", "projects.update"):
+                get_supabase().table("projects").update({"game_assets": game_assets}).eq("id", req.project_id).execute()
 
+        record_chat_turn(user, game_name, req.new_prompt, "Updated the sandbox preview.")
         logging.info(f"Sandbox code updated for project {req.project_id} by user {user['id']}")
-        return {"status": "success", "sandbox_code": updated_code}
+        return {
+            "status": "success",
+            "sandbox_code": updated_code,
+            "sandbox_etag": etag,
+            "preview_url": f"/api/sandbox/preview/{req.project_id}",
+        }
 
     except HTTPException:
         raise
@@ -649,6 +1529,51 @@ async def api_sandbox_update(request: Request, req: SandboxUpdateRequest, user:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/sandbox/preview/{project_id}")
+@limiter.limit("120/minute")
+async def api_sandbox_preview(request: Request, project_id: str, user: dict = Depends(verify_user)):
+    """
+    Serves the stored sandbox_code as HTML with a strong ETag. Revalidations
+    only read game_assets->>sandbox_etag and answer 304 when it still matches;
+    otherwise the precompressed br/gzip body is sent from the preview cache.
+    """
+    encoding = negotiate_preview_encoding(request.headers.get("accept-encoding"))
+    if_none_match = request.headers.get("if-none-match")
+    cache_headers = {"Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+
+    with track_dependency("supabase", "projects.select"):
+        res = get_supabase().table("projects").select("sandbox_etag:game_assets->>sandbox_etag").eq("id", project_id).eq("user_id", user["id"]).execute()
+    if not res.data:
+        raise HTTPException(status_code=404, detail="Project not found or access denied.")
+    content_hash = res.data[0].get("sandbox_etag")
+
+    if content_hash and preview_etag_matches(if_none_match, content_hash):
+        METRICS.inc("playful_preview_responses_total", {"result": "not_modified", "encoding": encoding})
+        return Response(status_code=304, headers={**cache_headers, "ETag": preview_etag(content_hash, encoding)})
+
+    result = "hit"
+    variants = cached_preview(project_id, content_hash) if content_hash else None
+    if variants is None:
+        # Cold process, evicted entry, or a row saved before sandbox_etag existed
+        result = "miss"
+        with track_dependency("supabase", "projects.select"):
+            res = get_supabase().table("projects").select("sandbox_code:game_assets->>sandbox_code").eq("id", project_id).eq("user_id", user["id"]).execute()
+        code = res.data[0].get("sandbox_code") if res.data else None
+        if not code:
+            raise HTTPException(status_code=404, detail="No sandbox code found for this project. Generate a preview first.")
+        variants = await asyncio.to_thread(build_preview_variants, code)
+        cache_preview(project_id, variants)
+        if preview_etag_matches(if_none_match, variants["hash"]):
+            METRICS.inc("playful_preview_responses_total", {"result": "not_modified", "encoding": encoding})
+            return Response(status_code=304, headers={**cache_headers, "ETag": preview_etag(variants["hash"], encoding)})
+
+    METRICS.inc("playful_preview_responses_total", {"result": result, "encoding": encoding})
+    headers = {**cache_headers, "ETag": preview_etag(variants["hash"], encoding), "X-Content-Type-Options": "nosniff"}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=variants[encoding], media_type="text/html; charset=utf-8", headers=headers)
+
+
 @app.post("/api/build/apk")
 @limiter.limit("5/minute")
 async def api_build_apk_sandbox(request: Request, req: BuildApkRequest, background_tasks: BackgroundTasks, user: dict = Depends(verify_user)):
@@ -663,6 +1588,26 @@ async def api_build_apk_sandbox(request: Request, req: BuildApkRequest, backgrou
     background_tasks.add_task(build_apk_workflow, job_id, req, user)
     return {"job_id": job_id, "status": "queued"}
 
+
+@app.post("/api/build/apk/batch")
+@limiter.limit("2/minute")
+async def api_build_apk_batch(request: Request, req: BatchBuildApkRequest, background_tasks: BackgroundTasks, user: dict = Depends(verify_user)):
+    """
+    Queues APK builds for several projects at once: one staging commit, one
+    matrix workflow run, and one job_id whose "projects" map carries per-project
+    status, progress and apk_url over /status and the WebSocket.
+    """
+    project_ids = list(dict.fromkeys(req.project_ids))
+    job_id = str(uuid.uuid4())
+    JOB_STORE[job_id] = {
+        "status": "queued",
+        "message": f"Queuing batch build of {len(project_ids)} games...",
+        "progress": 0,
+        "projects": {pid: {"status": "queued", "progress": 0} for pid in project_ids},
+    }
+    background_tasks.add_task(batch_build_apk_workflow, job_id, project_ids, user)
+    return {"job_id": job_id, "status": "queued", "project_ids": project_ids}
+
 # --- End Surgery 3 ---
 
 
@@ -672,11 +1617,12 @@ async def api_add_admob(request: Request, req: AddAdmobRequest, user: dict = Dep
     if user.get("plan", "free") == "free":
         raise HTTPException(status_code=403, detail="AdMob integration requires Creator or Studio plan.")
     try:
-        supabase.table("users").update({
-            "admob_banner": req.admob_banner,
-            "admob_interstitial": req.admob_interstitial,
-            "admob_interval": req.admob_interval
-        }).eq("id", user["id"]).execute()
+        with track_dependency("supabase", "users.update"):
+            get_supabase().table("users").update({
+                "admob_banner": req.admob_banner,
+                "admob_interstitial": req.admob_interstitial,
+                "admob_interval": req.admob_interval
+            }).eq("id", user["id"]).execute()
         return {"status": "success", "message": "AdMob settings locked in! 💰"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -712,10 +1658,7 @@ async def api_edit_game_name(request: Request, req: EditGameNameRequest, user: d
         new_commit = await github_api("POST", f"{repo_path}/git/commits", {"message": f"Rename game {req.old_game_name} -> {req.new_game_name}", "tree": new_tree["sha"], "parents": [base_sha]})
         await github_api("PATCH", f"{repo_path}/git/refs/heads/main", {"sha": new_commit["sha"]})
 
-        chat_history = user.get("chat_history", {})
-        if req.old_game_name in chat_history:
-            chat_history[req.new_game_name] = chat_history.pop(req.old_game_name)
-            supabase.table("users").update({"chat_history": chat_history}).eq("id", user["id"]).execute()
+        rename_chat_thread(user["id"], req.old_game_name, req.new_game_name)
 
         return {
             "status": "success",
@@ -731,10 +1674,7 @@ async def api_edit_game_name(request: Request, req: EditGameNameRequest, user: d
 async def api_delete_game(request: Request, req: GameRequest, user: dict = Depends(verify_user)):
     try:
         await delete_folder_from_github(user["username"], req.game_name)
-        chat_history = user.get("chat_history", {})
-        if req.game_name in chat_history:
-            del chat_history[req.game_name]
-            supabase.table("users").update({"chat_history": chat_history}).eq("id", user["id"]).execute()
+        delete_chat_thread(user["id"], req.game_name)
         return {"status": "success", "message": f"Game '{req.game_name}' deleted."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -760,9 +1700,13 @@ async def api_get_games(request: Request, user: dict = Depends(verify_user)):
 
 @app.post("/getchat")
 @limiter.limit("30/minute")
-async def api_get_chat(request: Request, req: GameRequest, user: dict = Depends(verify_user)):
-    chat_history = user.get("chat_history", {})
-    return {"game_name": req.game_name, "chat": chat_history.get(req.game_name, [])}
+async def api_get_chat(request: Request, req: GetChatRequest, user: dict = Depends(verify_user)):
+    """
+    Newest page of a game's chat first; pass back `next_cursor` as `cursor` to load
+    older messages. Each page is in chronological order.
+    """
+    messages, next_cursor = fetch_chat_page(user["id"], req.game_name, req.cursor, req.limit)
+    return {"game_name": req.game_name, "chat": messages, "next_cursor": next_cursor}
 
 
 @app.get("/status/{job_id}")
@@ -781,7 +1725,8 @@ async def api_toggle_favorite(request: Request, req: ToggleFavoriteRequest, user
     elif not req.is_favorite and req.game_name in favorites:
         favorites.remove(req.game_name)
 
-    supabase.table("users").update({"favorites": favorites}).eq("id", user["id"]).execute()
+    with track_dependency("supabase", "users.update"):
+        get_supabase().table("users").update({"favorites": favorites}).eq("id", user["id"]).execute()
     return {"status": "success", "favorites": favorites}
 
 
@@ -790,7 +1735,8 @@ async def api_toggle_favorite(request: Request, req: ToggleFavoriteRequest, user
 async def api_update_settings(request: Request, req: UpdateSettingsRequest, user: dict = Depends(verify_user)):
     settings = user.get("settings", {})
     settings["theme"] = req.theme
-    supabase.table("users").update({"settings": settings}).eq("id", user["id"]).execute()
+    with track_dependency("supabase", "users.update"):
+        get_supabase().table("users").update({"settings": settings}).eq("id", user["id"]).execute()
     return {"status": "success", "settings": settings}
 
 # ==========================================
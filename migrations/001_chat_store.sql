@@ -0,0 +1,30 @@
+-- Append-only chat store replacing the users.chat_history JSON blob.
+-- One thread per (user, game); renaming a game updates only chat_threads.game_name.
+
+create table if not exists chat_threads (
+    id uuid primary key default gen_random_uuid(),
+    user_id uuid not null references users (id) on delete cascade,
+    game_name text not null,
+    created_at timestamptz not null default now(),
+    unique (user_id, game_name)
+);
+
+create table if not exists chat_messages (
+    id bigint generated always as identity primary key,
+    thread_id uuid not null references chat_threads (id) on delete cascade,
+    user_id uuid not null,
+    role text not null,
+    content text not null,
+    created_at timestamptz not null default now()
+);
+
+-- Cursor pagination walks (thread_id, id desc).
+create index if not exists chat_messages_thread_id_id_idx on chat_messages (thread_id, id desc);
+
+-- Only the backend (service-role key, which bypasses RLS) touches chat data.
+-- With RLS on and no policies, plus no grants, the anon/authenticated roles
+-- that Supabase exposes through PostgREST can neither read nor write it.
+alter table chat_threads enable row level security;
+alter table chat_messages enable row level security;
+revoke all on table chat_threads from anon, authenticated;
+revoke all on table chat_messages from anon, authenticated;
@@ -0,0 +1,41 @@
+-- Makes the users.chat_history backfill atomic per game.
+-- A thread is only skipped by the backfill once history_imported is set, and
+-- the thread, its messages and that flag are written in one transaction, so a
+-- failed import leaves nothing behind for the next run to trip over.
+
+alter table chat_threads add column if not exists history_imported boolean not null default false;
+
+create or replace function import_chat_history(p_user_id uuid, p_game_name text, p_messages jsonb)
+returns boolean
+language plpgsql
+as $$
+declare
+    v_thread_id uuid;
+    v_imported boolean;
+begin
+    insert into chat_threads (user_id, game_name)
+    values (p_user_id, p_game_name)
+    on conflict (user_id, game_name) do nothing;
+
+    select id, history_imported into v_thread_id, v_imported
+    from chat_threads
+    where user_id = p_user_id and game_name = p_game_name
+    for update;
+
+    if v_imported then
+        return false;
+    end if;
+
+    insert into chat_messages (thread_id, user_id, role, content)
+    select v_thread_id, p_user_id, m.value ->> 'role', m.value ->> 'content'
+    from jsonb_array_elements(p_messages) with ordinality as m(value, position)
+    order by m.position;
+
+    update chat_threads set history_imported = true where id = v_thread_id;
+    return true;
+end;
+$$;
+
+-- Supabase grants EXECUTE on new functions to anon/authenticated; this one takes
+-- an arbitrary user id and is for the backend's service role only.
+revoke execute on function import_chat_history(uuid, text, jsonb) from public, anon, authenticated;
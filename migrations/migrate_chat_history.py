@@ -0,0 +1,45 @@
+"""Backfills every users.chat_history blob into chat_threads/chat_messages.
+
+Apply 001_chat_store.sql and 002_chat_history_import.sql first, then from the repo root:
+
+    python -m migrations.migrate_chat_history [--batch 100]
+
+Safe to re-run: each game is imported in one transaction and only skipped once
+it has been, and a user's blob is cleared only after every game landed. Users
+who sign in before the backfill reaches them are migrated lazily by verify_user.
+"""
+import argparse
+import logging
+
+import main
+
+
+def migrate_all(batch: int) -> int:
+    migrated, last_id = 0, None
+    while True:
+        query = main.get_supabase().table("users").select("id, chat_history").not_.is_("chat_history", "null").order("id").limit(batch)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.execute().data
+        if not rows:
+            return migrated
+        for row in rows:
+            last_id = row["id"]
+            if not row["chat_history"]:
+                continue
+            try:
+                main.migrate_chat_history_blob(row["id"], row["chat_history"])
+                migrated += 1
+            except Exception as e:
+                logging.error(f"User {row['id']} not migrated: {e}")
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+    logging.info(f"Migrated {migrate_all(args.batch)} user(s)")
+
+
+if __name__ == "__main__":
+    run()
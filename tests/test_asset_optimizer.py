@@ -0,0 +1,149 @@
+import io
+import os
+import json
+import struct
+import zipfile
+
+import pytest
+
+import asset_optimizer
+from asset_optimizer import OptimizationReport, optimize_asset_bundle, optimize_document, optimize_glb, parse_glb, write_glb
+
+# Not decodable as images, so recompression leaves them alone; odd lengths exercise padding.
+IMAGE_A = b"image-A"
+IMAGE_B = b"image-BB"
+FLOATS = struct.pack("<3f", 1.0, 2.0, 3.0)
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(asset_optimizer, "ASSET_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+def pack(chunks):
+    """Lays chunks out back to back (unaligned) and returns (binary, bufferViews)."""
+    binary, views = b"", []
+    for chunk in chunks:
+        views.append({"buffer": 0, "byteOffset": len(binary), "byteLength": len(chunk)})
+        binary += chunk
+    return binary, views
+
+
+def glb_with_unused_image(extensions=None):
+    binary, views = pack([IMAGE_A, IMAGE_B, FLOATS])
+    document = {
+        "asset": {"version": "2.0"},
+        "buffers": [{"byteLength": len(binary)}],
+        "bufferViews": views,
+        "accessors": [{"bufferView": 2, "componentType": 5126, "count": 3, "type": "SCALAR"}],
+        "images": [{"bufferView": 0, "mimeType": "image/png"}, {"bufferView": 1, "mimeType": "image/png"}],
+        "textures": [{"source": 0}],
+    }
+    if extensions:
+        document["extensionsUsed"] = extensions
+    return write_glb(document, binary)
+
+
+def zip_bytes(files):
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as z:
+        for name, data in files.items():
+            z.writestr(name, data)
+    return out.getvalue()
+
+
+def test_duplicate_images_are_merged_and_textures_remapped():
+    binary, views = pack([IMAGE_A, IMAGE_A])
+    document = {
+        "buffers": [{"byteLength": len(binary)}],
+        "bufferViews": views,
+        "images": [{"bufferView": 0}, {"bufferView": 1}],
+        "textures": [{"source": 0}, {"source": 1}],
+    }
+    report = OptimizationReport(uid="dup")
+    optimize_document(document, [binary], lambda uri: None, report, 1024, 85)
+
+    assert [t["source"] for t in document["textures"]] == [0, 0]
+    assert len(document["images"]) == 1
+    assert len(document["bufferViews"]) == 1
+    assert report.images_deduplicated == 1
+
+
+def test_unused_image_is_dropped_and_views_repacked_aligned():
+    report = OptimizationReport(uid="prune")
+    document, binary = parse_glb(optimize_glb(glb_with_unused_image(), report, 1024, 85))
+
+    assert len(document["images"]) == 1
+    assert len(document["bufferViews"]) == 2
+    assert all(view["byteOffset"] % 4 == 0 for view in document["bufferViews"])
+    assert report.images_removed == 1 and report.buffer_views_removed == 1
+
+    image_view = document["bufferViews"][document["images"][0]["bufferView"]]
+    assert binary[image_view["byteOffset"]:image_view["byteOffset"] + image_view["byteLength"]] == IMAGE_A
+
+
+def test_accessors_still_resolve_after_compaction():
+    document, binary = parse_glb(optimize_glb(glb_with_unused_image(), OptimizationReport(uid="acc"), 1024, 85))
+
+    view = document["bufferViews"][document["accessors"][0]["bufferView"]]
+    assert binary[view["byteOffset"]:view["byteOffset"] + view["byteLength"]] == FLOATS
+
+
+def test_gltf_keeps_referenced_external_files_and_drops_the_rest():
+    bin_data, views = pack([FLOATS])
+    document = {
+        "asset": {"version": "2.0"},
+        "buffers": [{"uri": "scene.bin", "byteLength": len(bin_data)}],
+        "bufferViews": views,
+        "accessors": [{"bufferView": 0, "componentType": 5126, "count": 3, "type": "SCALAR"}],
+        "images": [{"uri": "textures/base%20color.png"}],
+        "textures": [{"source": 0}],
+    }
+    payload = zip_bytes({
+        "model/scene.gltf": json.dumps(document),
+        "model/scene.bin": bin_data,
+        "model/textures/base color.png": IMAGE_A,
+        "model/textures/unused.png": IMAGE_B,
+        "license.txt": "CC0",
+    })
+
+    files, report = optimize_asset_bundle("gltf", payload)
+
+    assert set(files) == {"model/scene.gltf", "model/scene.bin", "model/textures/base color.png", "license.txt"}
+    assert files["model/textures/base color.png"] == IMAGE_A
+    assert report.files_removed == 1
+
+
+def test_meshopt_bundles_pass_through_unchanged():
+    payload = glb_with_unused_image(extensions=["EXT_meshopt_compression"])
+
+    files, report = optimize_asset_bundle("meshopt", payload)
+
+    assert files == {"meshopt.glb": payload}
+    assert report.saved_bytes == 0
+
+
+def test_second_call_with_same_payload_is_served_from_cache():
+    payload = glb_with_unused_image()
+
+    first_files, first = optimize_asset_bundle("cached", payload)
+    second_files, second = optimize_asset_bundle("cached", payload)
+
+    assert not first.cached and second.cached
+    assert second_files == first_files
+    assert second.images_removed == first.images_removed
+
+
+def test_cache_prune_evicts_least_recently_used(cache_dir):
+    for key in ("old", "mid", "new"):
+        asset_optimizer._cache_store(key, {"a.bin": b"x" * 1000}, OptimizationReport(uid=key))
+    entry_size = (cache_dir / "new.zip").stat().st_size
+    for age, key in enumerate(("new", "mid", "old")):
+        stamp = 1_000_000 - age * 10
+        os.utime(cache_dir / f"{key}.zip", (stamp, stamp))
+    asset_optimizer._cache_load("old")
+
+    asset_optimizer._cache_prune(max_bytes=2 * entry_size)
+
+    assert sorted(p.name for p in cache_dir.glob("*.zip")) == ["new.zip", "old.zip"]
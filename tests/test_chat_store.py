@@ -0,0 +1,97 @@
+import threading
+import time
+import uuid
+
+import pytest
+import uvicorn
+from supabase import create_client
+
+import main
+from bench.fakes import create_app
+
+
+@pytest.fixture(scope="module")
+def fake_db():
+    """Serves bench.fakes on an ephemeral port and points main's Supabase client at it."""
+    app = create_app({}, users=0)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    previous = main._CLIENTS.get("supabase")
+    main._CLIENTS["supabase"] = create_client(f"http://127.0.0.1:{port}/supabase", "bench.fake.key")
+    yield app.state.db
+    if previous is None:
+        main._CLIENTS.pop("supabase", None)
+    else:
+        main._CLIENTS["supabase"] = previous
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def user_id(fake_db):
+    return str(uuid.uuid4())
+
+
+def seed_messages(user_id, game_name, count):
+    main.append_chat_messages(user_id, game_name, [{"role": "user", "content": f"m{i}"} for i in range(count)])
+
+
+def walk(user_id, game_name, limit):
+    pages, cursor = [], None
+    while True:
+        messages, cursor = main.fetch_chat_page(user_id, game_name, cursor=cursor, limit=limit)
+        pages.append([m["content"] for m in messages])
+        if cursor is None:
+            return pages
+
+
+def test_pages_are_chronological_newest_first(user_id):
+    seed_messages(user_id, "game", 7)
+
+    assert walk(user_id, "game", 3) == [["m4", "m5", "m6"], ["m1", "m2", "m3"], ["m0"]]
+
+
+def test_paging_is_exact_at_limit_boundaries(user_id):
+    seed_messages(user_id, "game", 6)
+
+    assert walk(user_id, "game", 3) == [["m3", "m4", "m5"], ["m0", "m1", "m2"]]
+    assert walk(user_id, "game", 6) == [["m0", "m1", "m2", "m3", "m4", "m5"]]
+
+
+def test_missing_thread_is_an_empty_last_page(user_id):
+    assert main.fetch_chat_page(user_id, "nothing") == ([], None)
+
+
+def test_rename_onto_existing_thread_replaces_it_without_orphans(fake_db, user_id):
+    seed_messages(user_id, "old", 2)
+    seed_messages(user_id, "new", 3)
+
+    main.rename_chat_thread(user_id, "old", "new")
+
+    assert walk(user_id, "new", 10) == [["m0", "m1"]]
+    assert main.get_chat_thread_id(user_id, "old") is None
+    thread_ids = {t["id"] for t in fake_db.tables["chat_threads"]}
+    assert all(m["thread_id"] in thread_ids for m in fake_db.tables["chat_messages"])
+
+
+def test_rename_without_thread_leaves_target_alone(user_id):
+    seed_messages(user_id, "new", 1)
+
+    main.rename_chat_thread(user_id, "ghost", "new")
+
+    assert walk(user_id, "new", 10) == [["m0"]]
+
+
+def test_delete_cascades_to_messages(fake_db, user_id):
+    seed_messages(user_id, "game", 4)
+    thread_id = main.get_chat_thread_id(user_id, "game")
+
+    main.delete_chat_thread(user_id, "game")
+
+    assert main.get_chat_thread_id(user_id, "game") is None
+    assert not [m for m in fake_db.tables["chat_messages"] if m["thread_id"] == thread_id]
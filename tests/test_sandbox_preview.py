@@ -0,0 +1,16 @@
+from main import minify_inline_scripts
+
+
+def test_line_comment_closing_a_block_comment_is_kept():
+    html = '<script>\n/*\n// note */ var a = 1;\nvar s = "http://x"; // trailing\n</script>'
+    assert minify_inline_scripts(html) == '<script>/*\n// note */ var a = 1;\nvar s = "http://x"; // trailing</script>'
+
+
+def test_whole_line_comments_and_indentation_are_dropped():
+    html = "<script>\n    // setup\n    const a = 1;\n\n    function f() {\n        return a;\n    }\n</script>"
+    assert minify_inline_scripts(html) == "<script>const a = 1;\nfunction f() {\nreturn a;\n}</script>"
+
+
+def test_template_literals_and_non_js_scripts_are_untouched():
+    html = '<script>\n  const s = `a\n  // b`;\n</script><script type="x-shader/x-fragment">\n  // keep\n</script>'
+    assert minify_inline_scripts(html) == html